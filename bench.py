@@ -0,0 +1,215 @@
+"""
+Micro-benchmarks for the CPU-side hot paths of the bot (no network, no database).
+Every benchmark runs at 1x, 10x and 100x fixture scale; the best-of-N time per call is
+compared against the stored baseline, and slower-than-threshold results fail the run.
+
+    python bench.py                 # run, compare against .benchmarks/baseline.json if present
+    python bench.py --save          # run and store the results as the new baseline
+    python bench.py -k profile      # only benchmarks whose name contains "profile"
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import timeit
+import uuid as uuidlib
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+SCALES = (1, 10, 100)
+BASELINE = Path(".benchmarks/baseline.json")
+
+# Benchmarks need a loadable config but never talk to Telegram, the panel or the database
+os.environ.setdefault("BOT_TOKEN", "42:BENCH")
+os.environ.setdefault("REMNAWAVE_URL", "http://127.0.0.1:1")
+os.environ.setdefault("REMNAWAVE_API_KEY", "bench")
+os.environ.setdefault("ADMIN_GROUP_ID", "-100")
+os.environ.setdefault("POSTGRES_USER", "bench")
+os.environ.setdefault("POSTGRES_PASSWORD", "bench")
+os.environ.setdefault("POSTGRES_DB", "bench")
+os.environ.setdefault("LOG_FILE", os.path.join(tempfile.mkdtemp(prefix="bench-logs-"), "debug.log"))
+os.environ.setdefault("LOG_CONSOLE_LEVEL", "WARNING")
+
+from aiogram.types import Message, Chat, User
+from bot.logging_setup import setup_logging
+from bot.middlewares.i18n import I18nMiddleware
+from bot.middlewares.logging import StructLoggingMiddleware
+from bot.services.remnawave import Account, Device
+from bot.services.orders import plan_fulfillment
+from bot.services import navigation
+from bot.handlers.user import split_accounts, format_traffic, format_expiry, device_rows
+
+rng = random.Random(0)
+now = datetime.now(timezone.utc)
+USER_ID = 10_000_001
+
+def _uuid() -> str:
+    return str(uuidlib.UUID(int=rng.getrandbits(128), version=4))
+
+def panel_user(i: int, telegram_id: int | None = None, username: str | None = None) -> dict:
+    limit = rng.choice((0, 50, 100)) * 1024 ** 3
+    return {
+        "uuid": _uuid(),
+        "username": username or f"user_{i}",
+        "telegramId": telegram_id,
+        "status": "ACTIVE",
+        "expireAt": (now + timedelta(days=rng.randint(-30, 60))).isoformat().replace("+00:00", "Z"),
+        "trafficLimitBytes": limit,
+        "userTraffic": {"usedTrafficBytes": rng.randint(0, limit or 1024 ** 3)},
+        "tag": rng.choice((None, "TRIAL_YES", "VIP")),
+    }
+
+# --- Benchmarks: setup(scale) returns the callable that is timed ---
+
+def bench_account_candidates(scale: int):
+    # Fuzzy panel search results: a few real matches among unrelated users
+    raw = [panel_user(i, USER_ID if i % 5 == 0 else USER_ID + i) for i in range(5 * scale)]
+    raw[0]["username"] = f"tg_{USER_ID}"
+
+    def run():
+        split_accounts(USER_ID, [a for a in map(Account.from_payload, raw) if a])
+    return run
+
+def bench_profile_formatting(scale: int):
+    l10n = I18nMiddleware().l10n_en
+    accounts = [Account.from_payload(panel_user(i)) for i in range(scale)]
+
+    def run():
+        for account in accounts:
+            format_traffic(l10n, account)
+            format_expiry(l10n, account)
+    return run
+
+def bench_device_keyboard(scale: int):
+    devices = [
+        Device(hwid=f"hw{i}", user_uuid="u", platform=rng.choice(("Android", "iOS", "Windows")),
+               device_model=rng.choice(("Pixel 8", "iPhone 15 Pro Max", "ThinkPad X1 Carbon")),
+               updated_at=now - timedelta(minutes=i))
+        for i in range(5 * scale)
+    ]
+    target = _uuid()
+    # device_rows() stores its tokens in the global nav: give it a private store, emptied every call,
+    # so timings don't depend on what earlier scales and runs left there
+    store = navigation.nav = navigation.NavigationStore()
+
+    def run():
+        store._items.clear()
+        device_rows(USER_ID, target, devices)
+    return run
+
+def bench_fulfillment_plan(scale: int):
+    users = [panel_user(i) for i in range(scale)]
+    squad = _uuid()
+
+    def run():
+        for u in users:
+            plan_fulfillment(u, False, 100, 30, squad)
+    return run
+
+def bench_fluent_main_menu(scale: int):
+    l10n = I18nMiddleware().l10n_en
+
+    def run():
+        for _ in range(scale):
+            l10n.format_value("start-welcome", {"name": "Alice"})
+            for key in ("btn-shop", "btn-profile", "btn-trial", "btn-support"):
+                l10n.format_value(key)
+    return run
+
+def bench_logging_middleware(scale: int):
+    middleware = StructLoggingMiddleware()
+    user = User(id=USER_ID, is_bot=False, first_name="Alice", username="alice")
+    event = Message(message_id=1, date=now, chat=Chat(id=USER_ID, type="private"), from_user=user, text="👤 Profile")
+    loop = asyncio.new_event_loop()
+
+    async def handler(event, data):
+        return None
+
+    async def batch():
+        for _ in range(scale):
+            await middleware(handler, event, {"event_from_user": user})
+
+    def run():
+        loop.run_until_complete(batch())
+    return run
+
+BENCHMARKS = {
+    "account_candidates": bench_account_candidates,
+    "profile_formatting": bench_profile_formatting,
+    "device_keyboard": bench_device_keyboard,
+    "fulfillment_plan": bench_fulfillment_plan,
+    "fluent_main_menu": bench_fluent_main_menu,
+    "logging_middleware": bench_logging_middleware,
+}
+
+def measure(fn, repeat: int) -> float:
+    """Best seconds per call over `repeat` rounds of ~0.2s each"""
+    timer = timeit.Timer(fn)
+    loops, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=loops)) / loops
+
+def fmt(seconds: float) -> str:
+    for unit, factor in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= factor:
+            return f"{seconds / factor:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="filter", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save", action="store_true", help="Store results as the baseline")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown vs baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    setup_logging()
+    baseline = {}
+    if args.baseline.exists():
+        stored = json.loads(args.baseline.read_text())
+        baseline = stored.get("results", {})
+        if stored.get("machine") != platform.node() or stored.get("python") != platform.python_version():
+            print(f"Note: baseline was recorded on {stored.get('machine')} / Python {stored.get('python')}")
+
+    results = {}
+    regressions = []
+    print(f"{'benchmark':<32}{'per call':>12}{'baseline':>12}{'change':>9}")
+    for name, setup in BENCHMARKS.items():
+        if args.filter and args.filter not in name:
+            continue
+        for scale in SCALES:
+            key = f"{name}[{scale}x]"
+            seconds = measure(setup(scale), args.repeat)
+            results[key] = seconds
+            base = baseline.get(key)
+            change = ""
+            if base:
+                ratio = seconds / base - 1
+                change = f"{ratio:+.0%}"
+                if ratio > args.threshold:
+                    regressions.append(key)
+                    change += " !"
+            print(f"{key:<32}{fmt(seconds):>12}{fmt(base) if base else '-':>12}{change:>9}")
+
+    if args.save:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        merged = {**baseline, **results}
+        args.baseline.write_text(json.dumps({
+            "machine": platform.node(),
+            "python": platform.python_version(),
+            "saved_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "results": merged,
+        }, indent=2))
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
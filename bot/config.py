@@ -9,7 +9,91 @@ class Settings(BaseSettings):
     # Remnawave
     remnawave_url: str
     remnawave_api_key: SecretStr
-    
+    remnawave_pool_limit: int = 100 # Total open connections to the panel
+    remnawave_pool_limit_per_host: int = 30
+    remnawave_dns_ttl: int = 300 # Seconds
+    remnawave_keepalive_timeout: float = 30.0
+    remnawave_timeout: float = 10.0 # Seconds, single-object calls
+    remnawave_list_timeout: float = 30.0 # Seconds, paginated listing pages
+    remnawave_retries: int = 2 # Extra attempts for GETs on transient errors
+    remnawave_backoff_base: float = 0.3
+    remnawave_backoff_max: float = 3.0
+    remnawave_breaker_threshold: int = 5 # Consecutive failures before failing fast
+    remnawave_breaker_reset: float = 30.0 # Seconds before a probe request is let through
+    remnawave_max_concurrency: int = 20 # In-flight panel requests across all priorities
+    remnawave_rate_payment: float = 0.0 # Requests/second per priority, 0 = unlimited
+    remnawave_rate_default: float = 30.0
+    remnawave_rate_background: float = 5.0
+    remnawave_rate_burst: float = 10.0
+    remnawave_user_cache_size: int = 10000
+    remnawave_user_cache_ttl: float = 30.0 # Seconds
+    remnawave_user_negative_ttl: float = 10.0 # Seconds to remember 404s
+    remnawave_users_page_size: int = 500
+    remnawave_devices_page_size: int = 500
+    remnawave_page_prefetch: int = 1 # Pages requested ahead of the consumer
+    remnawave_devices_refresh_interval: float = 60.0 # Background crawl period, seconds
+    remnawave_devices_max_age: float = 180.0 # Older index is re-crawled on demand
+    remnawave_mirror_sync_interval: float = 300.0 # remnawave_accounts sync period, seconds
+    remnawave_mirror_max_age: float = 900.0 # Past this since the last successful sync, lookups go to the panel
+    remnawave_squads_refresh_interval: float = 600.0 # Squad catalog refresh period, seconds
+    # Panel event webhook (push invalidation). Route is only registered when the secret is set.
+    remnawave_webhook_secret: Optional[SecretStr] = None
+    remnawave_webhook_path: str = "/remnawave/webhook"
+    remnawave_webhook_tolerance: float = 300.0 # Max clock skew / replay window, seconds
+
+    # Rendered profile cache
+    profile_cache_size: int = 10000
+    profile_cache_ttl: float = 20.0 # Seconds a rendered profile counts as fresh
+    profile_cache_max_stale: float = 600.0 # How long a stale copy may stand in while refreshing or when the panel is down
+
+    # Callback navigation context (device screens)
+    nav_context_size: int = 50000
+    nav_context_ttl: float = 900.0 # Seconds a button token stays valid
+
+    # Per-user language cache (I18nMiddleware)
+    i18n_cache_size: int = 50000
+    i18n_cache_ttl: float = 3600.0
+
+    # Logging (written by a background thread)
+    log_file: str = "logs/debug.log"
+    log_console_level: str = "INFO"
+    log_file_level: str = "DEBUG"
+    log_max_bytes: int = 50 * 1024 * 1024 # Rotate above this size, 0 = never
+    log_rotate_interval: float = 86400.0 # Rotate after this many seconds, 0 = never
+    log_backup_count: int = 10
+    log_compress: bool = True # gzip rotated files
+    log_queue_size: int = 10000 # Records beyond this are dropped rather than blocking
+    log_update_sample_rate: float = 0.1 # Share of updates whose update_started/finished are logged
+    log_slow_update_threshold: float = 1.0 # Seconds; slower updates are always logged (update_slow)
+    log_sample_rates: dict[str, float] = Field(default_factory=dict) # Per-event keep ratio for debug/info events
+    log_rate_limit_events: list[str] = Field(default_factory=lambda: [
+        "remnawave_request_failed", "remnawave_retry", "remnawave_get_users_fail",
+    ])
+    log_rate_limit_burst: int = 5 # Per event/status/method and window
+    log_rate_limit_window: float = 60.0 # Seconds
+
+    # Tracing (per-update spans: handler, SQL, panel, Fluent, Telegram)
+    trace_exporter: str = "none" # none | file | otlp
+    trace_sample_rate: float = 1.0 # Share of updates traced; the correlation id is sent regardless
+    trace_file: str = "logs/traces.jsonl" # One OTLP/JSON export request per line
+    trace_otlp_endpoint: str = "http://localhost:4318/v1/traces" # OTLP/HTTP JSON collector
+    trace_service_name: str = "remnawave-shop-bot"
+    trace_export_interval: float = 5.0 # Seconds between batches
+    trace_queue_size: int = 2000 # Finished traces beyond this are dropped until the next export
+
+    # Metrics (Prometheus text format)
+    metrics_path: str = "/metrics" # Served on the webhook app in webhook mode, only when metrics_token is set
+    metrics_host: str = "127.0.0.1" # Side server used in polling mode
+    metrics_port: int = 9100 # 0 = no side server in polling mode
+    metrics_token: Optional[SecretStr] = None # Scrapes must send "Authorization: Bearer <token>"; required in webhook mode
+    metrics_loop_lag_interval: float = 0.5 # Seconds between event loop lag probes
+
+    # CPU profiling (/profile_cpu and the HTTP trigger)
+    profile_max_seconds: int = 300 # Longest capture an admin can ask for
+    profile_sample_interval: float = 0.005 # Seconds between stack samples while a capture runs
+    profile_token: Optional[SecretStr] = None # Enables the HTTP trigger; callers send "Authorization: Bearer <token>"
+    profile_path: str = "/debug/profile_cpu" # POST ?seconds=N on the webhook app / metrics side server
+
     # Database
     postgres_user: str
     postgres_password: SecretStr
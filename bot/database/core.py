@@ -1,10 +1,55 @@
+import time
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from bot.config import config
 from bot.database.models import Base
+from bot.utils import metrics
+from bot.utils.tracing import start_span, DB
 
-engine = create_async_engine(config.database_url, echo=False)
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """The default async pool, plus how long each checkout waited for a free connection"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.db_checkout_wait.observe(time.perf_counter() - started)
+
+engine = create_async_engine(config.database_url, echo=False, poolclass=TimedQueuePool)
 async_session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
+metrics.db_pool.set_function(lambda: {
+    ("idle",): engine.pool.checkedin(),
+    ("checked_out",): engine.pool.checkedout(),
+    ("overflow",): max(0, engine.pool.overflow()),
+})
+
+# One span per statement; the async driver runs these hooks inside the calling task's context
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _statement_started(conn, cursor, statement, parameters, context, executemany):
+    s = start_span(f"db {statement.split(None, 1)[0].upper()}", DB, statement=statement[:500])
+    conn.info.setdefault("trace_spans", []).append(s)
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _statement_finished(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get("trace_spans")
+    s = spans.pop() if spans else None
+    if s is not None:
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            s.set(rows=cursor.rowcount)
+        s.finish()
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _statement_failed(exception_context):
+    conn = exception_context.connection
+    spans = conn.info.get("trace_spans") if conn is not None else None
+    s = spans.pop() if spans else None
+    if s is not None:
+        s.error = f"{type(exception_context.original_exception).__name__}: {exception_context.original_exception}"
+        s.finish()
+
 async def get_session() -> AsyncSession:
     async with async_session() as session:
         yield session
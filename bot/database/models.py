@@ -27,14 +27,23 @@ class User(Base):
     full_name: Mapped[str | None] = mapped_column(String(255), nullable=True)
     language_code: Mapped[str] = mapped_column(String(10), default="en")
     
-    remnawave_uuid: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    remnawave_uuid: Mapped[str | None] = mapped_column(String(100), nullable=True, index=True)
     
     # balance field removed
     is_trial_used: Mapped[bool] = mapped_column(Boolean, default=False)
+
+    # Subscription snapshot, kept by fulfill_order and the account mirror (bot.services.subscriptions)
+    current_tariff_id: Mapped[int | None] = mapped_column(ForeignKey("tariffs.id"), nullable=True)
+    sub_expire_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    sub_traffic_limit_bytes: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    sub_traffic_used_bytes: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    sub_url: Mapped[str | None] = mapped_column(String, nullable=True)
+    sub_synced_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     
     orders: Mapped[list["Order"]] = relationship(back_populates="user")
+    current_tariff: Mapped["Tariff | None"] = relationship()
 
 class Tariff(Base):
     __tablename__ = "tariffs"
@@ -113,3 +122,20 @@ class SpecialTariff(Base):
     traffic_gb: Mapped[float] = mapped_column(Float)
     duration_months: Mapped[int] = mapped_column(Integer)
     tag: Mapped[str | None] = mapped_column(String, nullable=True)
+
+class RemnawaveAccount(Base):
+    """Local mirror of panel users, kept fresh by bot.services.accounts.AccountMirror"""
+    __tablename__ = "remnawave_accounts"
+
+    uuid: Mapped[str] = mapped_column(String(100), primary_key=True)
+    username: Mapped[str] = mapped_column(String(255), index=True)
+    telegram_id: Mapped[int | None] = mapped_column(BigInteger, nullable=True, index=True)
+
+    expire_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    traffic_limit_bytes: Mapped[int] = mapped_column(BigInteger, default=0)
+    traffic_used_bytes: Mapped[int] = mapped_column(BigInteger, default=0)
+    tag: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    subscription_url: Mapped[str | None] = mapped_column(String, nullable=True)
+
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True) # Panel updatedAt (sync cursor)
+    synced_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -8,6 +8,9 @@ from bot.services.settings import SettingsService
 from bot.database import models
 from sqlalchemy import select, delete
 from bot.services.remnawave import api
+from bot.services.accounts import mirror
+from bot.services.squads import catalog
+from bot.services.profiles import profiles
 from datetime import datetime, timedelta
 from html import escape
 import structlog
@@ -53,6 +56,14 @@ async def get_main_kb(l10n: FluentLocalization):
         [types.InlineKeyboardButton(text=l10n.format_value("admin-btn-exit"), callback_data="admin_exit")]
     ])
 
+def get_squad_picker_kb(l10n: FluentLocalization, back_cb: str, allow_default: bool = False):
+    # Squads come from the in-memory catalog, no panel round trip
+    rows = [[types.InlineKeyboardButton(text=f"🛡 {s.name}", callback_data=f"sq_pick_{s.uuid}")] for s in catalog.all()]
+    if allow_default:
+        rows.append([types.InlineKeyboardButton(text=l10n.format_value("admin-squad-default-btn"), callback_data="sq_pick_0")])
+    rows.append([types.InlineKeyboardButton(text=l10n.format_value("btn-cancel"), callback_data=back_cb)])
+    return types.InlineKeyboardMarkup(inline_keyboard=rows)
+
 # ... cmd_admin ...
 
 @router.message(Command("admin"))
@@ -60,6 +71,28 @@ async def cmd_admin(message: types.Message, state: FSMContext, l10n: FluentLocal
     if message.from_user.id not in config.admin_ids:
         return
         
+    await show_admin_menu(message, state, l10n)
+
+@router.message(Command("profile_cpu"))
+async def cmd_profile_cpu(message: types.Message, l10n: FluentLocalization):
+    if message.from_user.id not in config.admin_ids:
+        return
+    from bot.services.diagnostics import start_cpu_profile
+
+    args = (message.text or "").split()
+    try:
+        seconds = int(args[1])
+    except (IndexError, ValueError):
+        seconds = 0
+    if not 1 <= seconds <= config.profile_max_seconds:
+        await message.answer(l10n.format_value("admin-profile-usage", {"max": config.profile_max_seconds}))
+        return
+    if not start_cpu_profile(message.bot, seconds, requested_by=f"admin {message.from_user.id}"):
+        await message.answer(l10n.format_value("admin-profile-busy"))
+        return
+    await message.answer(l10n.format_value("admin-profile-started", {"seconds": seconds}))
+
+async def show_admin_menu(message: types.Message, state: FSMContext, l10n: FluentLocalization):
     await state.clear()
     await message.answer(l10n.format_value("admin-title"), reply_markup=await get_main_kb(l10n), parse_mode="Markdown")
 
@@ -97,14 +130,7 @@ async def trial_settings_menu(callback: types.CallbackQuery, state: FSMContext,
     squad_val = settings['squad_uuid']
     squad_display = squad_val
     if squad_val and squad_val != "0" and squad_val != "None":
-        try:
-             squad_data = await api.get_squad(squad_val)
-             s = squad_data.get('response', squad_data)
-             
-             name = s.get('slug') or s.get('name') or "Unnamed"
-             squad_display = f"{name} ({squad_val})"
-        except Exception:
-             pass
+        squad_display = catalog.display(squad_val)
 
     text = f"{l10n.format_value('admin-trial-title')}\n\n" + \
            l10n.format_value("admin-trial-info", {
@@ -157,13 +183,39 @@ async def set_traffic(message: types.Message, state: FSMContext, l10n: FluentLoc
 @router.callback_query(F.data == "a_edit_squad")
 async def ask_squad(callback: types.CallbackQuery, state: FSMContext, l10n: FluentLocalization):
     await state.set_state(AdminStates.edit_trial_plan) # Reuse state or rename? Reuse is fine but confusing. Let's keep state name.
-    await callback.message.edit_text(l10n.format_value("admin-ask-squad"), reply_markup=types.InlineKeyboardMarkup(inline_keyboard=[[types.InlineKeyboardButton(text=l10n.format_value("btn-cancel"), callback_data="admin_trial")]]))
+    await callback.message.edit_text(l10n.format_value("admin-ask-squad"), reply_markup=get_squad_picker_kb(l10n, "admin_trial"))
 
 @router.message(AdminStates.edit_trial_plan)
 async def set_squad(message: types.Message, state: FSMContext, l10n: FluentLocalization):
-    await SettingsService.set_setting("trial_squad_uuid", message.text.strip())
-    await message.answer(l10n.format_value("admin-set-squad-success", {"val": message.text}))
-    await cmd_admin(message, state, l10n)
+    squad_uuid = message.text.strip()
+    if not await validate_squad(message, squad_uuid, l10n):
+        return
+    await save_trial_squad(message, state, l10n, squad_uuid)
+
+async def save_trial_squad(message: types.Message, state: FSMContext, l10n: FluentLocalization, squad_uuid: str):
+    await SettingsService.set_setting("trial_squad_uuid", squad_uuid)
+    await message.answer(l10n.format_value("admin-set-squad-success", {"val": catalog.display(squad_uuid)}))
+    await show_admin_menu(message, state, l10n)
+
+async def validate_squad(message: types.Message, squad_uuid: str, l10n: FluentLocalization) -> bool:
+    if squad_uuid == "0" or catalog.is_known(squad_uuid):
+        return True
+    await message.answer(l10n.format_value("admin-squad-unknown", {"val": squad_uuid}))
+    return False
+
+@router.callback_query(F.data.startswith("sq_pick_"))
+async def pick_squad(callback: types.CallbackQuery, state: FSMContext, session, l10n: FluentLocalization):
+    # Squad picker shared by the trial, custom plan and standard tariff wizards
+    squad_uuid = callback.data[len("sq_pick_"):]
+    current = await state.get_state()
+    await callback.answer()
+    
+    if current == AdminStates.edit_trial_plan.state:
+        await save_trial_squad(callback.message, state, l10n, squad_uuid)
+    elif current == AdminStates.cp_squad.state:
+        await save_cp_squad(callback.message, state, l10n, squad_uuid)
+    elif current == AdminStates.t_squad.state:
+        await save_t_squad(callback.message, state, session, l10n, squad_uuid)
 
 # --- Custom Plans (Special Tariffs) ---
 
@@ -194,11 +246,17 @@ async def cp_start_create(callback: types.CallbackQuery, state: FSMContext, l10n
 async def cp_set_name(message: types.Message, state: FSMContext, l10n: FluentLocalization):
     await state.update_data(name=message.text)
     await state.set_state(AdminStates.cp_squad)
-    await message.answer(l10n.format_value("admin-cp-create-step2"))
+    await message.answer(l10n.format_value("admin-cp-create-step2"), reply_markup=get_squad_picker_kb(l10n, "admin_cp_list"))
 
 @router.message(AdminStates.cp_squad)
 async def cp_set_squad(message: types.Message, state: FSMContext, l10n: FluentLocalization):
-    await state.update_data(squad=message.text.strip())
+    squad_uuid = message.text.strip()
+    if not await validate_squad(message, squad_uuid, l10n):
+        return
+    await save_cp_squad(message, state, l10n, squad_uuid)
+
+async def save_cp_squad(message: types.Message, state: FSMContext, l10n: FluentLocalization, squad_uuid: str):
+    await state.update_data(squad=squad_uuid)
     await state.set_state(AdminStates.cp_traffic)
     await message.answer(l10n.format_value("admin-cp-create-step3"))
 
@@ -287,14 +345,7 @@ async def cp_view(callback: types.CallbackQuery, state: FSMContext, session, l10
     # Resolve Squad Name
     squad_display = tariff.squad_uuid or "N/A"
     if tariff.squad_uuid and tariff.squad_uuid != "0":
-        try:
-             squad_data = await api.get_squad(tariff.squad_uuid)
-             s = squad_data.get('response', squad_data)
-             
-             name = s.get('slug') or s.get('name') or "Unnamed"
-             squad_display = f"{name} ({tariff.squad_uuid})"
-        except Exception:
-             pass
+        squad_display = catalog.display(tariff.squad_uuid)
 
     text = (
         f"{l10n.format_value('admin-cp-view-title', {'name': tariff.name})}\n\n"
@@ -417,7 +468,9 @@ async def cp_grant_execute(callback: types.CallbackQuery, state: FSMContext, ses
         if tgid > 0:
             updates["telegramId"] = tgid
             
-        await api.update_user(uuid, updates)
+        update_resp = await api.update_user(uuid, updates)
+        await mirror.remember(update_resp)
+        profiles.invalidate_account(uuid)
         
         # 4. Squad
         if tariff.squad_uuid and tariff.squad_uuid != "0":
@@ -434,6 +487,8 @@ async def cp_grant_execute(callback: types.CallbackQuery, state: FSMContext, ses
                 # Update link
                 user.remnawave_uuid = uuid
             await session.commit()
+            await mirror.push_snapshots(uuid)
+            profiles.invalidate(tgid)
             
         # 6. Report
         # 6. Report
@@ -542,14 +597,19 @@ async def t_set_traffic(message: types.Message, state: FSMContext, session, l10n
         limit = int(message.text)
         await state.update_data(traffic=limit)
         await state.set_state(AdminStates.t_squad)
-        await message.answer(l10n.format_value("admin-t-ask-squad"))
+        await message.answer(l10n.format_value("admin-t-ask-squad"), reply_markup=get_squad_picker_kb(l10n, "admin_tariffs_list", allow_default=True))
     except ValueError:
         await message.answer(l10n.format_value("admin-t-val-int"))
 
 @router.message(AdminStates.t_squad)
 async def t_set_squad(message: types.Message, state: FSMContext, session, l10n: FluentLocalization):
+    squad_uuid = message.text.strip()
+    if not await validate_squad(message, squad_uuid, l10n):
+        return
+    await save_t_squad(message, state, session, l10n, squad_uuid)
+
+async def save_t_squad(message: types.Message, state: FSMContext, session, l10n: FluentLocalization, squad_uuid: str):
     try:
-        squad_uuid = message.text.strip()
         if squad_uuid == "0":
             squad_uuid = None
             
@@ -588,15 +648,7 @@ async def t_view(callback: types.CallbackQuery, state: FSMContext, session, l10n
     # Resolve Squad Name
     squad_display = t.squad_uuid or "Default"
     if t.squad_uuid and t.squad_uuid != "0":
-        try:
-             squad_data = await api.get_squad(t.squad_uuid)
-             # Handle response wrapper if present
-             s = squad_data.get('response', squad_data)
-             
-             name = s.get('slug') or s.get('name') or "Unnamed"
-             squad_display = f"{name} ({t.squad_uuid})"
-        except Exception:
-             pass
+        squad_display = catalog.display(t.squad_uuid)
         
     text = (
         f"{l10n.format_value('admin-t-view-title', {'name': t.name})}\n"
@@ -644,7 +696,6 @@ async def t_grant_process(message: types.Message, state: FSMContext, session, l1
 
         # Create paid order manually
         from bot.services.orders import create_order, fulfill_order
-        from bot.services.remnawave import api
         
         # Create order with 0 price (gift)
         order = await create_order(
@@ -659,21 +710,11 @@ async def t_grant_process(message: types.Message, state: FSMContext, session, l1
         await session.commit()
         
         # Fulfill
-        success = await fulfill_order(order.id, session)
+        # Returns the post-update panel user
+        user_data = await fulfill_order(order.id, session)
         
-        if success:
-             # Refresh user to get remnawave_uuid
-             await session.refresh(u)
-             
-             # Fetch sub link
-             link = "N/A"
-             if u.remnawave_uuid:
-                 try:
-                     rw_user = await api.get_user(u.remnawave_uuid)
-                     user_data = rw_user.get('response', rw_user)
-                     link = user_data.get('subscriptionUrl') or user_data.get('subUrl') or user_data.get('subscription_url') or "Link not found in API"
-                 except Exception as e:
-                     link = f"Error fetching link: {e}"
+        if user_data:
+             link = user_data.get('subscriptionUrl') or user_data.get('subUrl') or user_data.get('subscription_url') or "Link not found in API"
              
              display_username = f" (@{escape(u.username)})" if u.username else ""
              
@@ -1,64 +1,108 @@
+import asyncio
 from aiogram import Router, types, F
 from aiogram.filters import CommandStart
 from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import joinedload
 from bot.database.core import get_session
 from bot.database import models
-from bot.config import config
+from bot.middlewares.i18n import languages
 from fluent.runtime import FluentLocalization
 from datetime import datetime, timezone, timedelta
-from dateutil import parser
 
 router = Router()
 
-async def check_existing_accounts(user_id: int):
+MSK = timezone(timedelta(hours=3))
+
+def traffic_bar(percent: float) -> str:
+    # Traffic Bar (Green -> Yellow -> Orange -> Red)
+    bar_parts = []
+    for i in range(5):
+        low = i * 20
+        high = (i + 1) * 20
+        if percent >= high:
+            bar_parts.append("🟥")
+        elif percent <= low:
+            bar_parts.append("🟩")
+        elif (percent - low) < 10:
+            bar_parts.append("🟨")
+        else:
+            bar_parts.append("🟧")
+    return "".join(bar_parts)
+
+def format_traffic(l10n: FluentLocalization, account) -> str:
+    return l10n.format_value("profile-traffic", {
+        "used": round(account.traffic_used_bytes / (1024**3), 2),
+        "limit": round(account.traffic_limit_bytes / (1024**3), 1),
+        "percent": account.traffic_percent,
+        "bar": traffic_bar(account.traffic_percent)
+    })
+
+def format_expiry(l10n: FluentLocalization, account) -> str:
+    if not account.expire_at:
+        return l10n.format_value("subscription-none")
+    date_str = account.expire_at.astimezone(MSK).strftime("%Y-%m-%d %H:%M MSK")
+    if account.is_active():
+        return l10n.format_value("profile-expiry", {"date": date_str})
+    return l10n.format_value("subscription-expired", {"date": date_str})
+
+async def find_accounts(user_id: int):
     """
     Searches for accounts by Telegram ID.
     Returns: (standard_account, manual_accounts_list)
     standard_account: Account with username "tg_{user_id}"
     manual_accounts_list: List of other accounts with matching telegramId
+    Panel errors propagate; see check_existing_accounts for the forgiving variant.
     """
-    from bot.services.remnawave import api
-    import structlog
-    logger = structlog.get_logger()
+    from bot.services.remnawave import api, Account
+    from bot.services.accounts import mirror
 
-    try:
-        # Use search to find user by ID (more reliable than fetching all)
+    if mirror.ready:
+        # Indexed lookup in the local mirror, no panel round trip
+        candidates = await mirror.find_by_telegram_id(user_id)
+    else:
+        # Mirror not synced yet: fall back to a fuzzy panel search
         users = await api.get_users(search=str(user_id))
         
-        candidates = []
-        if isinstance(users, list): candidates = users
+        raw = []
+        if isinstance(users, list): raw = users
         elif isinstance(users, dict):
              if 'response' in users:
                  r = users['response']
-                 if isinstance(r, list): candidates = r
+                 if isinstance(r, list): raw = r
                  elif isinstance(r, dict):
-                     candidates = r.get('users', []) or r.get('data', [])
+                     raw = r.get('users', []) or r.get('data', [])
+        candidates = [a for a in map(Account.from_payload, raw) if a]
+
+    return split_accounts(user_id, candidates)
 
-        standard = None
-        manual = []
+def split_accounts(user_id: int, candidates) -> tuple:
+    """(standard, manual) among lookup candidates; see find_accounts"""
+    standard = None
+    manual = []
+    
+    target_username = f"tg_{user_id}"
+    
+    for acc in candidates:
+        # API search is fuzzy, so verify ID or exact username
+        is_match = False
+        if acc.telegram_id == user_id: is_match = True
+        if acc.username == target_username: is_match = True
         
-        target_username = f"tg_{user_id}"
+        if is_match:
+            if acc.username == target_username:
+                standard = acc
+            else:
+                manual.append(acc)
         
+    return standard, manual
 
-        
-        for u in candidates:
-            # Check explicit telegramId match (robust) or username match
-            tid = u.get('telegramId')
-            uname = u.get('username')
-            
-            # API search is fuzzy, so verify ID or exact username
-            is_match = False
-            if str(tid) == str(user_id): is_match = True
-            if uname == target_username: is_match = True
-            
-            if is_match:
-                if uname == target_username:
-                    standard = u
-                else:
-                    manual.append(u)
-            
-        return standard, manual
+async def check_existing_accounts(user_id: int):
+    """find_accounts that logs failures and reports no accounts instead of raising"""
+    import structlog
+    logger = structlog.get_logger()
+
+    try:
+        return await find_accounts(user_id)
     except Exception as e:
         logger.error("check_accounts_error", error=str(e), user_id=user_id)
         return None, []
@@ -66,7 +110,7 @@ async def check_existing_accounts(user_id: int):
 @router.message(CommandStart())
 async def cmd_start(message: types.Message, l10n: FluentLocalization, session):
     # Create or update user
-    stmt = select(models.User).where(models.User.id == message.from_user.id)
+    stmt = select(models.User).options(joinedload(models.User.current_tariff)).where(models.User.id == message.from_user.id)
     result = await session.execute(stmt)
     user = result.scalar_one_or_none()
 
@@ -86,13 +130,17 @@ async def cmd_start(message: types.Message, l10n: FluentLocalization, session):
     if not user.remnawave_uuid:
         std_acc, man_acc_list = await check_existing_accounts(message.from_user.id)
         if std_acc:
-            user.remnawave_uuid = std_acc['uuid']
+            user.remnawave_uuid = std_acc.uuid
+            from bot.services.profiles import profiles
+            profiles.invalidate(user.id)
             # We don't need to notify "Linked", just proceed as normal
         elif man_acc_list:
             # Pick the first one for notification
             found_manual_acc = man_acc_list[0]
             
     await session.commit()
+    # Row exists now (possibly just created), so its language wins over the middleware's guess
+    languages.set(user.id, user.language_code)
 
     # Welcome message
     text = l10n.format_value("start-welcome", {"name": message.from_user.first_name})
@@ -110,24 +158,18 @@ async def cmd_start(message: types.Message, l10n: FluentLocalization, session):
     if found_manual_acc:
          # Calculate expiry for display
          exp_date = "Unlimited"
-         expire_at = found_manual_acc.get('expireAt')
-         if expire_at:
-             try:
-                 dt = parser.isoparse(expire_at)
-                 if dt.tzinfo is None: dt = dt.replace(tzinfo=timezone.utc)
-                 msk_tz = timezone(timedelta(hours=3))
-                 exp_date = dt.astimezone(msk_tz).strftime("%Y-%m-%d")
-             except: pass
+         if found_manual_acc.expire_at:
+             exp_date = found_manual_acc.expire_at.astimezone(MSK).strftime("%Y-%m-%d")
              
          msg_text = l10n.format_value("account-found-manual", {
-             "username": found_manual.get('username', 'Unknown'),
+             "username": found_manual_acc.username or 'Unknown',
              "tariff": "Manual/Imported", 
              "expire": exp_date
          })
          
          ikb = types.InlineKeyboardMarkup(inline_keyboard=[
              [types.InlineKeyboardButton(text=l10n.format_value("btn-create-new"), callback_data="req_trial_new")],
-             [types.InlineKeyboardButton(text=l10n.format_value("btn-use-existing"), callback_data=f"link_acc_{found_manual['uuid']}")]
+             [types.InlineKeyboardButton(text=l10n.format_value("btn-use-existing"), callback_data=f"link_acc_{found_manual_acc.uuid}")]
          ])
          await message.answer(msg_text, reply_markup=ikb, parse_mode="Markdown")
 
@@ -135,49 +177,22 @@ async def cmd_start(message: types.Message, l10n: FluentLocalization, session):
     if user.remnawave_uuid:
         try:
              from bot.services.remnawave import api
+             from bot.services.subscriptions import snapshot_account
              from html import escape
-             from dateutil import parser
-             from datetime import datetime, timezone, timedelta
-             
-             # Get API User
-             rw_user = await api.get_user(user.remnawave_uuid)
-             data = rw_user.get('response', rw_user)
              
-             if not data: return 
+             # Local snapshot first, panel only when there is none
+             account = snapshot_account(user) or await api.get_account(user.remnawave_uuid)
+             if not account: return 
 
-             # Check Expiry
-             expire_at = data.get('expireAt')
-             is_active = False
-             date_str = "Unlimited"
-             
-             if expire_at:
-                 dt = parser.isoparse(expire_at)
-                 if dt.tzinfo is None: dt = dt.replace(tzinfo=timezone.utc)
-                 now_utc = datetime.now(timezone.utc)
-                 
-                 if dt > now_utc:
-                     is_active = True
-                     # Format Date
-                     msk_tz = timezone(timedelta(hours=3))
-                     date_str = dt.astimezone(msk_tz).strftime("%Y-%m-%d %H:%M MSK")
-             
-             if is_active:
-                 # Get Tariff Name from DB (Last Paid Order)
-                 stmt_order = select(models.Order).options(selectinload(models.Order.tariff)).where(
-                    models.Order.user_id == user.id, 
-                    models.Order.status == models.OrderStatus.PAID
-                 ).order_by(models.Order.created_at.desc()).limit(1)
-                 result_order = await session.execute(stmt_order)
-                 last_order = result_order.scalar_one_or_none()
-                 tariff_name = last_order.tariff.name if last_order and last_order.tariff else "Unknown"
+             if account.is_active():
+                 date_str = account.expire_at.astimezone(MSK).strftime("%Y-%m-%d %H:%M MSK")
+                 tariff_name = user.current_tariff.name if user.current_tariff else "Unknown"
                  
                  # Prepare Message
-                 link = data.get('subscriptionUrl') or f"{config.remnawave_url}/sub/{user.remnawave_uuid}"
-                 
                  msg = l10n.format_value("start-active-sub", {
                      "tariff": escape(tariff_name),
                      "date": date_str,
-                     "link": link
+                     "link": account.subscription_url
                  })
                  await message.answer(msg, parse_mode="HTML")
                  
@@ -210,26 +225,23 @@ async def process_trial(message: types.Message, session, l10n: FluentLocalizatio
         # We need UUID to check user. If we don't have it locally, we search.
         rw_uuid = user.remnawave_uuid
         
-        found_user_data = None
+        account = None
         if rw_uuid:
              try:
-                raw_user = await api.get_user(rw_uuid)
-                # Unwrap if needed
-                if raw_user and 'response' in raw_user:
-                    found_user_data = raw_user['response']
-                else:
-                    found_user_data = raw
+                account = await api.get_account(rw_uuid)
              except Exception:
                 # If 404 or other error, assume user not found via UUID
-                found_user_data = None
+                account = None
         
-        if not found_user_data:
+        if not account:
              std_acc, man_acc_list = await check_existing_accounts(user.id)
              
              if std_acc:
-                 found_user_data = std_acc
-                 user.remnawave_uuid = std_acc['uuid']
+                 account = std_acc
+                 user.remnawave_uuid = std_acc.uuid
                  await session.commit()
+                 from bot.services.profiles import profiles
+                 profiles.invalidate(user.id)
                  
              elif man_acc_list:
                  # Found manual accounts but no standard one.
@@ -237,54 +249,37 @@ async def process_trial(message: types.Message, session, l10n: FluentLocalizatio
                  found_manual = man_acc_list[0]
                  
                  exp_date = "Unlimited"
-                 expire_at = found_manual.get('expireAt')
-                 if expire_at:
-                     try:
-                         dt = parser.isoparse(expire_at)
-                         if dt.tzinfo is None: dt = dt.replace(tzinfo=timezone.utc)
-                         msk_tz = timezone(timedelta(hours=3))
-                         exp_date = dt.astimezone(msk_tz).strftime("%Y-%m-%d")
-                     except: pass
+                 if found_manual.expire_at:
+                     exp_date = found_manual.expire_at.astimezone(MSK).strftime("%Y-%m-%d")
                      
                  msg_text = l10n.format_value("account-found-manual", {
-                     "username": found_manual.get('username', 'Unknown'),
+                     "username": found_manual.username or 'Unknown',
                      "tariff": "Manual/Imported", 
                      "expire": exp_date
                  })
                  
                  ikb = types.InlineKeyboardMarkup(inline_keyboard=[
                      [types.InlineKeyboardButton(text=l10n.format_value("btn-create-new"), callback_data="req_trial_new")],
-                     [types.InlineKeyboardButton(text=l10n.format_value("btn-use-existing"), callback_data=f"link_acc_{found_manual['uuid']}")]
+                     [types.InlineKeyboardButton(text=l10n.format_value("btn-use-existing"), callback_data=f"link_acc_{found_manual.uuid}")]
                  ])
                  await message.answer(msg_text, reply_markup=ikb, parse_mode="Markdown")
                  return
 
         # === Verification Block ===
-        tags = ""
-        if found_user_data:
-            tags = found_user_data.get('tag') or ""
+        tags = account.tag if account else ""
 
         logger.info("trial_check_debug", 
                    user_id=user.id,
                    rw_uuid=rw_uuid,
-                   found_in_api=bool(found_user_data),
+                   found_in_api=bool(account),
                    local_is_used=user.is_trial_used, 
                    api_tags=tags)
 
         # 1. Block conditions: Tag exists OR Local DB says used
-        if (found_user_data and "TRIAL_YES" in tags) or user.is_trial_used:
+        if (account and "TRIAL_YES" in tags) or user.is_trial_used:
              
              # Determine Expiry
-             expire_dt = None
-             from dateutil import parser
-             from datetime import datetime, timedelta, timezone
-             
-             if found_user_data:
-                 expire_at_str = found_user_data.get('expireAt')
-                 if expire_at_str:
-                     try:
-                         expire_dt = parser.isoparse(expire_at_str)
-                     except: pass
+             expire_dt = account.expire_at if account else None
              
              # If no API expiry but local says used, we have limited options.
              # If user.is_trial_used is True but API returned Nothing (404), 
@@ -299,22 +294,19 @@ async def process_trial(message: types.Message, session, l10n: FluentLocalizatio
              is_expired = False
              
              if expire_dt:
-                 if expire_dt.tzinfo is None:
-                     expire_dt = expire_dt.replace(tzinfo=timezone.utc)
                  if expire_dt < now_utc:
                      is_expired = True
-             elif user.is_trial_used and not found_user_data:
+             elif user.is_trial_used and not account:
                   # CASE: Local DB says used, but API says User Not Found (Deleted).
                   # User Request: Rely on API as source of truth to avoid desync.
                   # Action: Allow re-creation (pass through blocks).
                   # We simply do nothing here, falling through to order creation.
                   pass 
              
-             if found_user_data: # Only show info if we have data
+             if account: # Only show info if we have data
                  date_str = "Unlimited"
                  if expire_dt:
-                     msk_tz = timezone(timedelta(hours=3))
-                     expire_msk = expire_dt.astimezone(msk_tz)
+                     expire_msk = expire_dt.astimezone(MSK)
                      formatted_date = expire_msk.strftime("%Y-%m-%d %H:%M MSK")
                      
                      # Calculate remaining days (fractional)
@@ -333,12 +325,8 @@ async def process_trial(message: types.Message, session, l10n: FluentLocalizatio
                      await message.answer(l10n.format_value("trial-expired", {"date": date_str}))
                      return
                  else:
-                     link = found_user_data.get('subscriptionUrl')
-                     if not link:
-                          link = f"{config.remnawave_url}/sub/{found_user_data.get('uuid')}"
-                     
-                     traffic_bytes = found_user_data.get('trafficLimitBytes') or 0
-                     traffic_gb = round(int(traffic_bytes) / (1024**3), 1)
+                     link = account.subscription_url
+                     traffic_gb = round(account.traffic_limit_bytes / (1024**3), 1)
                      
                      msg_active = l10n.format_value("trial-active")
                      msg_traffic = l10n.format_value("trial-traffic", {"gb": traffic_gb})
@@ -354,7 +342,7 @@ async def process_trial(message: types.Message, session, l10n: FluentLocalizatio
                      )
                      return
              
-             # If found_user_data is None but we are here -> Fallthrough to create new order.
+             # If account is None but we are here -> Fallthrough to create new order.
              pass
 
     except Exception as e:
@@ -366,176 +354,89 @@ async def process_trial(message: types.Message, session, l10n: FluentLocalizatio
     await execute_trial_creation(message, session, l10n, user)
 
 async def generate_profile_content(user_id, session, l10n):
-    user = await session.get(models.User, user_id)
-    if not user: return None, None
+    from bot.services.profiles import profiles
+
+    view = await profiles.get(user_id, l10n.locales[0], lambda s: render_profile(user_id, s, l10n), session)
+    if not view: return None, None
+    return view.text, view.kb
+
+async def render_profile(user_id, session, l10n):
+    # Snapshot and current tariff come with the user row
+    user = await session.get(models.User, user_id, options=[joinedload(models.User.current_tariff)])
+    if not user: return None
     
-    # Fetch status from Remnawave
     from bot.services.remnawave import api
-    from dateutil import parser
-    from datetime import datetime, timezone, timedelta
+    from bot.services.profiles import ProfileView
+    from bot.services.subscriptions import snapshot_account
+    import aiohttp
+    import structlog
+    logger = structlog.get_logger()
 
-    rw_uuid = user.remnawave_uuid
-    found_user_data = None
-    
-    if rw_uuid:
+    async def fetch_account():
+        if not user.remnawave_uuid:
+            return None
+        snapshot = snapshot_account(user)
+        if snapshot:
+            return snapshot
         try:
-            raw = await api.get_user(rw_uuid)
-            if raw and 'response' in raw:
-                found_user_data = raw['response']
-            else:
-                found_user_data = raw
-        except:
-            found_user_data = None
-    
-    # Tariff Name from local DB
-    stmt = select(models.Order).options(selectinload(models.Order.tariff)).where(
-        models.Order.user_id == user.id, 
-        models.Order.status == models.OrderStatus.PAID
-    ).order_by(models.Order.created_at.desc()).limit(1)
-    
-    result = await session.execute(stmt)
-    last_order = result.scalar_one_or_none()
-    tariff_name = last_order.tariff.name if last_order and last_order.tariff else "Unknown"
+            return await api.get_account(user.remnawave_uuid)
+        except aiohttp.ClientResponseError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    # Panel status and linked accounts are independent
+    account, found = await asyncio.gather(fetch_account(), find_accounts(user.id), return_exceptions=True)
+    complete = True
+    if isinstance(account, BaseException):
+        logger.warning("profile_account_unavailable", user_id=user.id, error=str(account))
+        account, complete = None, False
+    if isinstance(found, BaseException):
+        logger.warning("profile_accounts_unavailable", user_id=user.id, error=str(found))
+        found, complete = (None, []), False
+
+    tariff_name = user.current_tariff.name if user.current_tariff else "Unknown"
 
     formatted_status = l10n.format_value("subscription-none")
     traffic_info = ""
     
-    if found_user_data:
-        # Expiry
-        expire_at_str = found_user_data.get('expireAt')
-        if expire_at_str:
-            try:
-                dt = parser.isoparse(expire_at_str)
-                if dt.tzinfo is None:
-                    dt = dt.replace(tzinfo=timezone.utc)
-                
-                msk_tz = timezone(timedelta(hours=3))
-                date_str = dt.astimezone(msk_tz).strftime("%Y-%m-%d %H:%M MSK")
-                
-                now_utc = datetime.now(timezone.utc)
-                if dt > now_utc:
-                    formatted_status = l10n.format_value("profile-expiry", {"date": date_str})
-                else:
-                    formatted_status = l10n.format_value("subscription-expired", {"date": date_str})
-            except:
-                pass
-        
-        # Traffic
-        limit_bytes = found_user_data.get('trafficLimitBytes') or 0
-        used_bytes = found_user_data.get('userTraffic', {}).get('usedTrafficBytes') or 0
-        
-        limit_gb = round(int(limit_bytes) / (1024**3), 1)
-        used_gb = round(int(used_bytes) / (1024**3), 2)
-        
-        percent = 0
-        if limit_bytes > 0:
-            percent = round((used_bytes / limit_bytes) * 100, 1)
-            
-        # Traffic Bar (Green -> Yellow -> Orange -> Red)
-        bar_parts = []
-        for i in range(5):
-             low = i * 20
-             high = (i + 1) * 20
-             if percent >= high:
-                 bar_parts.append("🟥")
-             elif percent <= low:
-                 bar_parts.append("🟩")
-             elif (percent - low) < 10:
-                 bar_parts.append("🟨")
-             else:
-                 bar_parts.append("🟧")
-        bar_str = "".join(bar_parts)
+    if account:
+        if account.expire_at:
+            formatted_status = format_expiry(l10n, account)
             
         t_tariff = l10n.format_value("profile-tariff", {"name": tariff_name})
-        t_traffic = l10n.format_value("profile-traffic", {"used": used_gb, "limit": limit_gb, "percent": percent, "bar": bar_str})
+        t_traffic = format_traffic(l10n, account)
         
         traffic_info = f"\n{t_tariff}\n{t_traffic}"
         
         # Link for main account
-        from bot.config import config
-        main_link = found_user_data.get('subscriptionUrl')
-        if not main_link:
-             main_link = f"{config.remnawave_url}/sub/{user.remnawave_uuid}"
-        
-        t_link = l10n.format_value("profile-link", {"link": main_link})
+        t_link = l10n.format_value("profile-link", {"link": account.subscription_url})
         traffic_info += f"\n{t_link}"
 
     # Additional Accounts Visibility
-    std_acc, manual_accs = await check_existing_accounts(user.id)
+    std_acc, manual_accs = found
     additional_accs = []
     current_uuid = user.remnawave_uuid
     
     # Add manual accounts if they are not current
     for m in manual_accs:
-        muuid = m.get('uuid')
-        if muuid != current_uuid:
+        if m.uuid != current_uuid:
             additional_accs.append(m)
             
     # Add standard account if it exists but is not current
-    if std_acc and std_acc.get('uuid') != current_uuid:
+    if std_acc and std_acc.uuid != current_uuid:
         additional_accs.append(std_acc)
         
     additional_info = ""
     if additional_accs:
         additional_info = "\n\n" + l10n.format_value("profile-additional-accounts") + "\n"
         for acc in additional_accs:
-            u_name = acc.get('username', 'Unknown')
-            
-            # Expiry
-            exp_str = l10n.format_value("subscription-none") # Default if missing
-            if acc.get('expireAt'):
-                try:
-                    edt = parser.isoparse(acc.get('expireAt'))
-                    if edt.tzinfo is None: edt = edt.replace(tzinfo=timezone.utc)
-                    msk_tz = timezone(timedelta(hours=3))
-                    date_str = edt.astimezone(msk_tz).strftime("%Y-%m-%d %H:%M MSK")
-                    
-                    now_utc = datetime.now(timezone.utc)
-                    if edt > now_utc:
-                        exp_str = l10n.format_value("profile-expiry", {"date": date_str})
-                    else:
-                        exp_str = l10n.format_value("subscription-expired", {"date": date_str})
-                        
-                except: pass
-                
-            # Traffic
-            limit_bytes = acc.get('trafficLimitBytes') or 0
-            used_bytes = acc.get('userTraffic', {}).get('usedTrafficBytes') or 0
-            limit_gb = round(int(limit_bytes) / (1024**3), 1)
-            used_gb = round(int(used_bytes) / (1024**3), 2)
-            
-            percent = 0
-            if limit_bytes > 0:
-                percent = round((used_bytes / limit_bytes) * 100, 1)
-                
-            bar_parts = []
-            for i in range(5):
-                 low = i * 20
-                 high = (i + 1) * 20
-                 if percent >= high:
-                     bar_parts.append("🟥")
-                 elif percent <= low:
-                     bar_parts.append("🟩")
-                 elif (percent - low) < 10:
-                     bar_parts.append("🟨")
-                 else:
-                     bar_parts.append("🟧")
-            bar_str = "".join(bar_parts)
-                
-            t_traffic = l10n.format_value("profile-traffic", {"used": used_gb, "limit": limit_gb, "percent": percent, "bar": bar_str})
-            
-            # Link
-            from bot.config import config
-            link = acc.get('subscriptionUrl')
-            if not link:
-                link = f"{config.remnawave_url}/sub/{acc.get('uuid')}"
-            
-            t_link = l10n.format_value("profile-link", {"link": link})
+            t_link = l10n.format_value("profile-link", {"link": acc.subscription_url})
             
             additional_info += l10n.format_value("profile-account-item", {
-                "username": u_name, 
-                "expiry": exp_str,
-                "traffic": t_traffic,
+                "username": acc.username or 'Unknown', 
+                "expiry": format_expiry(l10n, acc),
+                "traffic": format_traffic(l10n, acc),
                 "link": t_link
             }) + "\n"
 
@@ -550,8 +451,11 @@ async def generate_profile_content(user_id, session, l10n):
         [types.InlineKeyboardButton(text=l10n.format_value("btn-devices"), callback_data="my_devices")],
         [types.InlineKeyboardButton(text="🌐 Language / Язык", callback_data="change_lang")]
     ])
-    
-    return text, kb
+
+    shown = {a.uuid for a in additional_accs}
+    if account:
+        shown.add(account.uuid)
+    return ProfileView(text, kb, shown, complete)
 
 @router.message(F.text == "👤 Profile")
 @router.message(F.text == "👤 Профиль")
@@ -580,6 +484,7 @@ async def set_language(callback: types.CallbackQuery, session):
     if user:
         user.language_code = lang_code
         await session.commit()
+        languages.set(user.id, lang_code)
     
     if lang_code == "ru":
         text = "✅ Язык изменен на Русский.\nМеню обновлено."
@@ -605,9 +510,30 @@ async def set_language(callback: types.CallbackQuery, session):
     await callback.message.answer(text, reply_markup=keyboard)
     await callback.answer()
 
+async def get_device_accounts(user: models.User) -> set[str]:
+    """Panel accounts this user may manage devices for, remembered between clicks"""
+    from bot.services.navigation import nav
+
+    uuids = nav.accounts(user.id)
+    if uuids is None:
+        try:
+            std_acc, manual_accs = await find_accounts(user.id)
+        except Exception as e:
+            # Panel trouble: allow only the linked account and don't remember the partial set
+            import structlog
+            structlog.get_logger().warning("device_accounts_unavailable", user_id=user.id, error=str(e))
+            return {user.remnawave_uuid} if user.remnawave_uuid else set()
+        uuids = {a.uuid for a in manual_accs}
+        if std_acc: uuids.add(std_acc.uuid)
+        if user.remnawave_uuid: uuids.add(user.remnawave_uuid)
+        nav.set_accounts(user.id, uuids)
+    return uuids
+
 @router.callback_query(F.data == "my_devices")
 @router.callback_query(F.data.startswith("dev_acc_"))
 async def show_devices_list(callback: types.CallbackQuery, session, l10n: FluentLocalization):
+    from bot.services.navigation import nav
+
     user = await session.get(models.User, callback.from_user.id)
     if not user.remnawave_uuid:
         await callback.answer(l10n.format_value("subscription-none"), show_alert=True)
@@ -617,34 +543,48 @@ async def show_devices_list(callback: types.CallbackQuery, session, l10n: Fluent
     target_uuid = None
     if callback.data.startswith("dev_acc_"):
         target_uuid = callback.data.split("_", 2)[2]
+        if target_uuid not in await get_device_accounts(user):
+            await callback.answer("❌ Account context lost.", show_alert=True)
+            return
     else:
         # Initial entry: Check if we need selection menu
-        std_acc, manual_accs = await check_existing_accounts(user.id)
         all_accs = []
-        if std_acc: all_accs.append(std_acc)
-        all_accs.extend(manual_accs)
+        looked_up = False
+        try:
+            std_acc, manual_accs = await find_accounts(user.id)
+            looked_up = True
+        except Exception as e:
+            # Fall back to the linked account; the full list is looked up again next time
+            import structlog
+            structlog.get_logger().warning("device_accounts_unavailable", user_id=user.id, error=str(e))
+        else:
+            if std_acc: all_accs.append(std_acc)
+            all_accs.extend(manual_accs)
         
         # Deduplicate by UUID just in case
-        unique_accs = {a['uuid']: a for a in all_accs}.values()
+        unique_accs = {a.uuid: a for a in all_accs}.values()
         all_accs = list(unique_accs)
+        if looked_up:
+            nav.set_accounts(user.id, {a.uuid for a in all_accs} | {user.remnawave_uuid})
         
         if len(all_accs) > 1:
             # Show Selection Menu
             kb_rows = []
             for acc in all_accs:
-                 u_name = acc.get('username', 'Unknown')
-                 uuid = acc.get('uuid')
-                 kb_rows.append([types.InlineKeyboardButton(text=f"👤 {u_name}", callback_data=f"dev_acc_{uuid}")])
+                 kb_rows.append([types.InlineKeyboardButton(text=f"👤 {acc.username or 'Unknown'}", callback_data=f"dev_acc_{acc.uuid}")])
             
             kb_rows.append([types.InlineKeyboardButton(text=l10n.format_value("btn-back"), callback_data="back_profile")])
             await callback.message.edit_text(l10n.format_value("devices-select-account"), reply_markup=types.InlineKeyboardMarkup(inline_keyboard=kb_rows))
             return
         elif len(all_accs) == 1:
-            target_uuid = all_accs[0]['uuid']
+            target_uuid = all_accs[0].uuid
         else:
             # Fallback to current if something weird happens
             target_uuid = user.remnawave_uuid
 
+    await show_account_devices(callback, l10n, target_uuid)
+
+async def show_account_devices(callback: types.CallbackQuery, l10n: FluentLocalization, target_uuid: str):
     # 2. Show Devices for Target UUID
     from bot.services.remnawave import api
     
@@ -653,24 +593,6 @@ async def show_devices_list(callback: types.CallbackQuery, session, l10n: Fluent
     except Exception as e:
         devices = []
         
-    # UUID prefix for context in callbacks
-    # We use first 8 chars of UUID to save space in callback_data
-    uuid_prefix = target_uuid[:8]
-    # We store map in memory or just rely on prefix? 
-    # Actually, we need full UUID for delete. But callback length limit (64 bytes).
-    # UUID (36) + "del_dev_" (8) = 44. HWID is long.
-    # We must trust that target_uuid is user.remnawave_uuid OR verify usage.
-    # We will pass target_uuid in a simplified way or rely on a "current selection" state?
-    # Stateless is better.
-    # Let's try: dev_{uuid_part}_{hwid_part}
-    # But wait, 64 bytes is tight. 
-    # Strategy: Pass `dev_X<index>` where index maps to a cache? No, stateless.
-    # Let's use `d_<uuid-prefix>_<shorthwid>`?
-    # Allow full uuid lookup via prefix?
-    # user.py has no cache.
-    # Let's Assume: We pass `target_uuid` in button "Back" navigation, but for item details...
-    # We can use `d_{uuid_prefix}_{short_hwid}` and search efficiently.
-        
     if not devices:
         kb = types.InlineKeyboardMarkup(inline_keyboard=[
              [types.InlineKeyboardButton(text=l10n.format_value("btn-back"), callback_data=f"my_devices")] 
@@ -678,34 +600,7 @@ async def show_devices_list(callback: types.CallbackQuery, session, l10n: Fluent
         await callback.message.edit_text(l10n.format_value("devices-empty"), reply_markup=kb, parse_mode="HTML")
         return
 
-    kb_rows = []
-    msk_tz = timezone(timedelta(hours=3)) 
-
-    for dev in devices:
-        model = dev.get('deviceModel', 'Unknown')
-        platform = dev.get('platform', 'Unknown')
-        hwid = dev.get('hwid')
-        updated_at = dev.get('updatedAt')
-        
-        time_str = "?"
-        if updated_at:
-             try:
-                 dt = parser.isoparse(updated_at)
-                 if dt.tzinfo is None: dt = dt.replace(tzinfo=timezone.utc)
-                 time_str = dt.astimezone(msk_tz).strftime("%d.%m %H:%M")
-             except: pass
-        
-        btn_text = f"{model} ({platform}) {time_str}"
-        if len(btn_text) > 30: btn_text = btn_text[:29] + "…"
-        
-        # Format: dev_{uuid_head}_{hwid_head}
-        # uuid_head = 8 chars. hwid for WG is usually Key.
-        # Ensure we can exact match later.
-        # Store minimal unique data. 
-        # Actually, if we just pass index in list? No, race condition.
-        # Pass first 8 chars of HWID.
-        cb_data = f"dev_{target_uuid[:8]}_{hwid[:10]}"
-        kb_rows.append([types.InlineKeyboardButton(text=btn_text, callback_data=cb_data)])
+    kb_rows = device_rows(callback.from_user.id, target_uuid, devices)
     
     # Back button logic
     # If explicitly viewing account, back goes to "my_devices" (which checks list again)
@@ -714,96 +609,52 @@ async def show_devices_list(callback: types.CallbackQuery, session, l10n: Fluent
     msg_text = l10n.format_value("devices-title")
     await callback.message.edit_text(msg_text, reply_markup=types.InlineKeyboardMarkup(inline_keyboard=kb_rows), parse_mode="Markdown")
 
+def device_rows(user_id: int, target_uuid: str, devices) -> list:
+    """One button row per device, each behind a navigation token"""
+    from bot.services.navigation import nav
+
+    kb_rows = []
+    for dev in devices:
+        time_str = dev.updated_at.astimezone(MSK).strftime("%d.%m %H:%M") if dev.updated_at else "?"
+        
+        btn_text = f"{dev.device_model} ({dev.platform}) {time_str}"
+        if len(btn_text) > 30: btn_text = btn_text[:29] + "…"
+        
+        # Callback data is capped at 64 bytes: the button carries a token,
+        # the full account UUID and HWID stay in the navigation store
+        token = nav.put(user_id, (target_uuid, dev))
+        kb_rows.append([types.InlineKeyboardButton(text=btn_text, callback_data=f"dev_{token}")])
+    return kb_rows
+
+def resolve_device(callback: types.CallbackQuery):
+    """(account_uuid, Device) behind a dev_/del_/cdel_ token, or None once it expired"""
+    from bot.services.navigation import nav
+
+    token = callback.data.split("_", 1)[1]
+    return nav.get(callback.from_user.id, token)
+
 @router.callback_query(F.data.startswith("dev_"))
 async def show_device_details(callback: types.CallbackQuery, session, l10n: FluentLocalization):
-    # Format: dev_{uuid_head}_{hwid_head}
-    parts = callback.data.split("_")
-    if len(parts) < 3: return # Validation
-    
-    uuid_part = parts[1]
-    hwid_part = parts[2]
-    
-    user = await session.get(models.User, callback.from_user.id)
-    if not user: return
-    
-    # Resolve full UUID from all possible accounts
-    std_acc, manual_accs = await check_existing_accounts(user.id)
-    all_accs = []
-    if std_acc: all_accs.append(std_acc)
-    all_accs.extend(manual_accs)
-    
-    target_uuid = None
-    for acc in all_accs:
-        if acc['uuid'].startswith(uuid_part):
-            target_uuid = acc['uuid']
-            break
-            
-    if not target_uuid:
+    # Format: dev_{token}
+    ctx = resolve_device(callback)
+    if not ctx:
         await callback.answer("❌ Account context lost.", show_alert=True)
         return
-    
-    # Fetch devices for THAT account
-    from bot.services.remnawave import api
-    try:
-        devices = await api.get_user_devices(target_uuid)
-    except:
-        devices = []
-    
-    target_dev = None
-    for d in devices:
-        h = d.get('hwid')
-        if h and h.startswith(hwid_part): # HWID part match
-             target_dev = d
-             break
-    
-    if not target_dev:
-        await callback.answer(l10n.format_value("devices-empty"), show_alert=True)
-        # Return to list of THAT account
-        # We simulate callback with dev_acc_{uuid}
-        cb = types.CallbackQuery(
-            id=callback.id, 
-            from_user=callback.from_user, 
-            message=callback.message, 
-            chat_instance=callback.chat_instance,
-            data=f"dev_acc_{target_uuid}"
-        )
-        await show_devices_list(cb, session, l10n)
-        return
+    target_uuid, target_dev = ctx
+    token = callback.data.split("_", 1)[1]
 
-    model = target_dev.get('deviceModel', 'Unknown')
-    platform = target_dev.get('platform', 'Unknown')
-    updated_at = target_dev.get('updatedAt')
-    
-    msk_tz = timezone(timedelta(hours=3))
     last_act = "Unknown"
-    if updated_at:
-         dt = parser.isoparse(updated_at)
-         if dt.tzinfo is None: dt = dt.replace(tzinfo=timezone.utc)
-         last_act = dt.astimezone(msk_tz).strftime("%d.%m.%Y %H:%M:%S")
+    if target_dev.updated_at:
+         last_act = target_dev.updated_at.astimezone(MSK).strftime("%d.%m.%Y %H:%M:%S")
 
     text = l10n.format_value("devices-item", {
-        "model": model,
-        "platform": platform,
+        "model": target_dev.device_model,
+        "platform": target_dev.platform,
         "last_active": last_act
     })
     
-    # Delete using full HWID context: del_dev_{uuid_prefix}_{hwid_prefix}
-    # Wait, for delete we need full hwid? 
-    # API delete needs: hwid (full), userUuid (full).
-    # We have full userUuid (target_uuid).
-    # We DO NOT have full HWID in callback data if we truncated it previously?
-    # Ah, `target_dev` HAS full HWID.
-    # So we can pass full HWID in next step?
-    # Length limit: 64. 
-    # del_dev_ (8) + uuid_head(8) + _ (1) + hwid_head (10) = 27 chars. Safe.
-    # No, we need context for CONFIRMATION.
-    # Let's pass `del_{uuid_head}_{hwid_head}`. 
-    # Then re-fetch in confirm step to get full HWID again. Ideally reliable.
-    
-    del_cb = f"del_{uuid_part}_{hwid_part}"
-    
     kb = types.InlineKeyboardMarkup(inline_keyboard=[
-        [types.InlineKeyboardButton(text=l10n.format_value("btn-delete-device"), callback_data=del_cb)],
+        [types.InlineKeyboardButton(text=l10n.format_value("btn-delete-device"), callback_data=f"del_{token}")],
         [types.InlineKeyboardButton(text=l10n.format_value("btn-back"), callback_data=f"dev_acc_{target_uuid}")]
     ])
     
@@ -811,118 +662,43 @@ async def show_device_details(callback: types.CallbackQuery, session, l10n: Flue
 
 @router.callback_query(F.data.startswith("del_"))
 async def ask_delete_device(callback: types.CallbackQuery, session, l10n: FluentLocalization):
-    # Format: del_{uuid_part}_{hwid_part}
-    parts = callback.data.split("_")
-    if len(parts) < 3: return
-    
-    uuid_part = parts[1]
-    hwid_part = parts[2]
-    
-    user = await session.get(models.User, callback.from_user.id)
-    # Resolve Account
-    std_acc, manual_accs = await check_existing_accounts(user.id)
-    all_accs = []
-    if std_acc: all_accs.append(std_acc)
-    all_accs.extend(manual_accs)
-    
-    target_uuid = None
-    for acc in all_accs:
-        if acc['uuid'].startswith(uuid_part):
-            target_uuid = acc['uuid']
-            break
-            
-    if not target_uuid:
-        await callback.answer("❌ Account context lost.", show_alert=True)
+    # Format: del_{token}
+    ctx = resolve_device(callback)
+    if not ctx:
+        await callback.answer(l10n.format_value("device-delete-fail"), show_alert=True)
         return
+    _, target_dev = ctx
+    token = callback.data.split("_", 1)[1]
 
-    # Fetch device to get Name + Full HWID
-    model_name = "Device"
-    full_hwid = None
-    
-    from bot.services.remnawave import api
-    try:
-         devices = await api.get_user_devices(target_uuid)
-         for d in devices:
-             h = d.get('hwid')
-             if h and h.startswith(hwid_part):
-                 model_name = d.get('deviceModel', 'Device')
-                 full_hwid = h
-                 break
-    except: pass
-    
-    if not full_hwid:
-         await callback.answer(l10n.format_value("device-delete-fail"), show_alert=True)
-         return
-
-    # Callback for confirmation: cdel_{uuid_part}_{hwid_part}
-    
     kb = types.InlineKeyboardMarkup(inline_keyboard=[
         [
-            types.InlineKeyboardButton(text=l10n.format_value("btn-yes"), callback_data=f"cdel_{uuid_part}_{hwid_part}"),
-            types.InlineKeyboardButton(text=l10n.format_value("btn-no"), callback_data=f"dev_{uuid_part}_{hwid_part}")
+            types.InlineKeyboardButton(text=l10n.format_value("btn-yes"), callback_data=f"cdel_{token}"),
+            types.InlineKeyboardButton(text=l10n.format_value("btn-no"), callback_data=f"dev_{token}")
         ]
     ])
-    await callback.message.edit_text(l10n.format_value("device-confirm-delete", {"model": model_name}), reply_markup=kb, parse_mode="HTML")
+    await callback.message.edit_text(l10n.format_value("device-confirm-delete", {"model": target_dev.device_model}), reply_markup=kb, parse_mode="HTML")
 
 @router.callback_query(F.data.startswith("cdel_"))
 async def process_delete_device_wrapper(callback: types.CallbackQuery, session, l10n: FluentLocalization):
-     # Format: cdel_{uuid_part}_{hwid_part}
-     parts = callback.data.split("_")
-     if len(parts) < 3: return
-     
-     uuid_part = parts[1]
-     hwid_part = parts[2]
-     
-     user = await session.get(models.User, callback.from_user.id)
-     
-     # Resolve Account
-     std_acc, manual_accs = await check_existing_accounts(user.id)
-     all_accs = []
-     if std_acc: all_accs.append(std_acc)
-     all_accs.extend(manual_accs)
-    
-     target_uuid = None
-     for acc in all_accs:
-        if acc['uuid'].startswith(uuid_part):
-            target_uuid = acc['uuid']
-            break
-            
-     if not target_uuid:
-         await callback.answer("❌ Account context lost.", show_alert=True)
-         return
-
+     # Format: cdel_{token}
      from bot.services.remnawave import api
-     
-     # Re-resolve Full HWID (Safe approach)
-     full_hwid = None
-     try:
-          devices = await api.get_user_devices(target_uuid)
-          for d in devices:
-              h = d.get('hwid')
-              if h and h.startswith(hwid_part):
-                  full_hwid = h
-                  break
-     except: pass
-     
-     if not full_hwid:
+     from bot.services.navigation import nav
+
+     ctx = resolve_device(callback)
+     if not ctx:
           await callback.answer(l10n.format_value("device-delete-fail"), show_alert=True)
           return
+     target_uuid, target_dev = ctx
 
      try:
-         await api.delete_user_device(full_hwid, target_uuid)
+         await api.delete_user_device(target_dev.hwid, target_uuid)
+         nav.drop(callback.from_user.id, callback.data.split("_", 1)[1])
          await callback.answer(l10n.format_value("device-deleted"), show_alert=True)
      except Exception:
          await callback.answer(l10n.format_value("device-delete-fail"), show_alert=True)
      
      # Return to list
-     cb = types.CallbackQuery(
-            id=callback.id, 
-            from_user=callback.from_user, 
-            message=callback.message, 
-            chat_instance=callback.chat_instance,
-            data=f"dev_acc_{target_uuid}"
-        )
-     await show_devices_list(cb, session, l10n)
+     await show_account_devices(callback, l10n, target_uuid)
 
 @router.callback_query(F.data == "back_profile")
 async def back_to_profile(callback: types.CallbackQuery, session, l10n: FluentLocalization):
@@ -940,6 +716,8 @@ async def link_manual_account(callback: types.CallbackQuery, session, l10n: Flue
     if user:
         user.remnawave_uuid = uuid
         await session.commit()
+        from bot.services.profiles import profiles
+        profiles.invalidate(user.id)
     
     await callback.answer(l10n.format_value("trial-activated"), show_alert=True)
     
@@ -964,8 +742,6 @@ async def request_new_trial_explicit(callback: types.CallbackQuery, session, l10
 
 async def execute_trial_creation(messageable, session, l10n: FluentLocalization, user: models.User):
     import structlog
-    from bot.services.remnawave import api
-    from bot.config import config
     
     # Find trial tariff
     stmt = select(models.Tariff).where(models.Tariff.is_trial == True, models.Tariff.is_active == True)
@@ -995,55 +771,22 @@ async def execute_trial_creation(messageable, session, l10n: FluentLocalization,
     from bot.services.orders import create_order, fulfill_order
     order = await create_order(user.id, tariff.id, 0.0, models.PaymentProvider.MANUAL, session)
     
-    success = await fulfill_order(order.id, session)
-    if success:
-        # Get connection info (Subscription URL)
-        # Fetch fresh user data to get the correct subscription link
-        try:
-             rw_user = await api.get_user(user.remnawave_uuid)
-             # Extract data handling nesting
-             data = rw_user.get('response') if 'response' in rw_user else rw_user
-             
-             link = data.get('subscriptionUrl')
-             if not link:
-                 link = f"{config.remnawave_url}/sub/{user.remnawave_uuid}"
-            
-             # Parse details
-             traffic_bytes = data.get('trafficLimitBytes') or data.get('dataLimit') or 0
-             traffic_gb = round(int(traffic_bytes) / (1024**3), 1)
-             
-             # Fetch settings for correct display
-             from bot.services.settings import SettingsService
-             settings = await SettingsService.get_trial_settings()
-             duration_days = settings.get("days", tariff.duration_days)
-             
-             expire_at_str = data.get('expireAt')
-             # Use dynamic days
-             expire_display = f"{duration_days} Days"
-             
-             if expire_at_str:
-                 try:
-                     from dateutil import parser
-                     from datetime import timedelta, timezone
-                     
-                     dt = parser.isoparse(expire_at_str)
-                     # Ensure UTC awareness
-                     if dt.tzinfo is None:
-                         dt = dt.replace(tzinfo=timezone.utc)
-                         
-                     # Convert to MSK (UTC+3)
-                     msk_tz = timezone(timedelta(hours=3))
-                     dt_msk = dt.astimezone(msk_tz)
-                     
-                     date_str = dt_msk.strftime("%Y-%m-%d %H:%M MSK")
-                     expire_display += f" ({date_str})"
-                 except Exception:
-                     pass
-
-        except Exception:
-             link = f"{config.remnawave_url}/sub/{user.remnawave_uuid}"
-             traffic_gb = tariff.traffic_limit_gb
-             expire_display = f"{tariff.duration_days} Days"
+    # Post-update panel user, no need to fetch it again for the link
+    from bot.services.remnawave import Account
+    account = Account.from_payload(await fulfill_order(order.id, session) or {})
+    if account:
+        link = account.subscription_url
+        traffic_gb = round(account.traffic_limit_bytes / (1024**3), 1)
+        
+        # Fetch settings for correct display
+        from bot.services.settings import SettingsService
+        settings = await SettingsService.get_trial_settings()
+        duration_days = settings.get("days", tariff.duration_days)
+        
+        # Use dynamic days
+        expire_display = f"{duration_days} Days"
+        if account.expire_at:
+            expire_display += f" ({account.expire_at.astimezone(MSK).strftime('%Y-%m-%d %H:%M MSK')})"
              
         msg_activated = l10n.format_value("trial-activated")
         msg_traffic = l10n.format_value("trial-traffic", {"gb": traffic_gb})
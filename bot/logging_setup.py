@@ -1,13 +1,134 @@
+import atexit
+import gzip
 import logging
+import logging.handlers
+import os
+import queue
+import random
+import shutil
 import sys
+import time
 import structlog
 from pathlib import Path
+from bot.config import config
+from bot.utils import metrics
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Caller side of the pipeline: only puts the record on a bounded queue.
+    Rendering happens in the listener thread; when the queue is full the record is dropped
+    (and counted) instead of blocking the event loop.
+    """
+
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # structlog records carry the event dict for ProcessorFormatter: leave them as is.
+        # Foreign (stdlib) records get their message resolved now, while the args are still current.
+        if not isinstance(record.msg, dict) and record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class CompressingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Rolls over on size (maxBytes) or age (interval seconds), whichever comes first.
+    Rotated files are gzipped: debug.log.1.gz, debug.log.2.gz, ...
+    """
+
+    def __init__(self, filename, max_bytes: int = 0, interval: float = 0, backup_count: int = 0, compress: bool = True):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.interval = interval
+        self._next_rollover = time.time() + interval if interval else None
+        if compress:
+            self.namer = lambda name: name + ".gz"
+            self.rotator = self._gzip
+
+    @staticmethod
+    def _gzip(source: str, dest: str):
+        with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(source)
+
+    def shouldRollover(self, record) -> bool:
+        if self._next_rollover is not None and time.time() >= self._next_rollover:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        super().doRollover()
+        if self.interval:
+            self._next_rollover = time.time() + self.interval
+
+def sampled(rate: float) -> bool:
+    """True for roughly `rate` of calls (1 = always, 0 = never)"""
+    return rate >= 1 or random.random() < rate
+
+class LogSampler:
+    """
+    structlog processor placed right after the level filter, so dropped events cost almost nothing.
+    Events listed in log_sample_rates are kept with that probability (warnings and errors always pass).
+    Events listed in log_rate_limit_events pass at most log_rate_limit_burst times per window and
+    (event, status, method); the first one let through afterwards carries suppressed=N.
+    """
+
+    def __init__(self, rates: dict[str, float], limited: list[str], burst: int, window: float):
+        self.rates = rates
+        self.limited = set(limited)
+        self.burst = burst
+        self.window = window
+        self._windows: dict[tuple, list] = {} # key -> [window_start, passed, suppressed]
+
+    def __call__(self, logger, method_name: str, event_dict: dict) -> dict:
+        event = event_dict.get("event")
+        if event in self.limited:
+            key = (event, event_dict.get("status"), event_dict.get("method"))
+            now = time.monotonic()
+            state = self._windows.get(key)
+            if state is None:
+                state = self._windows[key] = [now, 0, 0]
+            elif now - state[0] >= self.window:
+                state[0], state[1] = now, 0
+            if state[1] >= self.burst:
+                state[2] += 1
+                raise structlog.DropEvent
+            state[1] += 1
+            if state[2]:
+                event_dict["suppressed"] = state[2]
+                state[2] = 0
+            return event_dict
+
+        rate = self.rates.get(event)
+        if rate is not None and method_name in ("debug", "info") and not sampled(rate):
+            raise structlog.DropEvent
+        return event_dict
+
+_listener: logging.handlers.QueueListener | None = None
+_queue_handler: DroppingQueueHandler | None = None
+_dropped_before = 0 # By queue handlers replaced on a repeated setup_logging()
+
+def dropped_records() -> int:
+    return _dropped_before + (_queue_handler.dropped if _queue_handler else 0)
+
+def _stop_listener():
+    if _listener:
+        _listener.stop()
 
 def setup_logging():
+    global _listener, _queue_handler, _dropped_before
+
     # Create logs directory if it doesn't exist
-    log_dir = Path("logs")
-    log_dir.mkdir(exist_ok=True)
-    
+    log_path = Path(config.log_file)
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+
     # Configure shared processors
     processors = [
         structlog.contextvars.merge_contextvars,
@@ -20,7 +141,7 @@ def setup_logging():
 
     # 1. Console Handler - Clean, User-Friendly (INFO+)
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.INFO)
+    console_handler.setLevel(config.log_console_level.upper())
     console_formatter = structlog.stdlib.ProcessorFormatter(
         # For console, we want colorful, readable output
         processor=structlog.dev.ConsoleRenderer(colors=True),
@@ -28,9 +149,15 @@ def setup_logging():
     )
     console_handler.setFormatter(console_formatter)
 
-    # 2. File Handler - Debug, Detailed (DEBUG+)
-    file_handler = logging.FileHandler("logs/debug.log", encoding="utf-8")
-    file_handler.setLevel(logging.DEBUG)
+    # 2. File Handler - Debug, Detailed (DEBUG+), rotated by size and age
+    file_handler = CompressingRotatingFileHandler(
+        log_path,
+        max_bytes=config.log_max_bytes,
+        interval=config.log_rotate_interval,
+        backup_count=config.log_backup_count,
+        compress=config.log_compress,
+    )
+    file_handler.setLevel(config.log_file_level.upper())
     file_formatter = structlog.stdlib.ProcessorFormatter(
         # For file, we want structured JSON or key=value for easy parsing/grepping
         processor=structlog.processors.JSONRenderer(),
@@ -38,15 +165,29 @@ def setup_logging():
     )
     file_handler.setFormatter(file_formatter)
 
+    # The event loop only enqueues; a background thread renders and writes to both sinks
+    if _listener:
+        _listener.stop()
+    else:
+        atexit.register(_stop_listener)
+    if _queue_handler:
+        _dropped_before += _queue_handler.dropped
+    log_queue: queue.Queue = queue.Queue(maxsize=config.log_queue_size)
+    queue_handler = _queue_handler = DroppingQueueHandler(log_queue)
+    _listener = logging.handlers.QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    _listener.start()
+    metrics.log_dropped.set_function(lambda: {(): dropped_records()})
+
     # Root Logger Configuration
     root_logger = logging.getLogger()
-    root_logger.setLevel(logging.DEBUG) # capture everything at root
-    root_logger.handlers = [console_handler, file_handler]
+    root_logger.setLevel(min(console_handler.level, file_handler.level)) # Nothing below the most verbose sink
+    root_logger.handlers = [queue_handler]
 
     # Structlog Configuration
     structlog.configure(
         processors=[
             structlog.stdlib.filter_by_level,
+            LogSampler(config.log_sample_rates, config.log_rate_limit_events, config.log_rate_limit_burst, config.log_rate_limit_window),
             *processors,
             structlog.stdlib.PositionalArgumentsFormatter(),
             structlog.processors.StackInfoRenderer(),
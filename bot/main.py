@@ -5,9 +5,18 @@ from bot.config import config
 from bot.database.core import init_db
 from bot.handlers import user, shop, support, admin_panel, fallback
 from bot.middlewares.i18n import I18nMiddleware
-from bot.middlewares.db import DbSessionMiddleware
+from bot.middlewares.db import DbSessionMiddleware, HandlerLabelMiddleware
 from bot.middlewares.logging import StructLoggingMiddleware
+from bot.middlewares.tracing import TracingMiddleware, TelegramTracingMiddleware
 from bot.webhooks.payments import handle_yookassa
+from bot.webhooks.remnawave import handle_remnawave
+from bot.webhooks.metrics import handle_metrics, start_metrics_server
+from bot.webhooks.diagnostics import handle_profile_cpu
+from bot.services.remnawave import api
+from bot.services.accounts import mirror
+from bot.services.squads import catalog
+from bot.utils.tracing import tracer
+from bot.utils import metrics
 
 from bot.logging_setup import setup_logging
 
@@ -20,14 +29,39 @@ logger = structlog.get_logger()
 async def main():
     setup_logging()
     await init_db()
-    
-    bot = Bot(token=config.bot_token.get_secret_value())
+    await api.startup()
+    api.start_background_tasks()
+    await mirror.start()
+    await catalog.start()
+    await tracer.start()
+    metrics.loop_monitor.start()
+    try:
+        await run()
+    finally:
+        await metrics.loop_monitor.stop()
+        await tracer.stop()
+        await catalog.stop()
+        await mirror.stop()
+        await api.close()
+
+def create_bot(**kwargs) -> Bot:
+    bot = Bot(token=config.bot_token.get_secret_value(), **kwargs)
+    bot.session.middleware(TelegramTracingMiddleware())
+    return bot
+
+def create_dispatcher() -> Dispatcher:
+    """Dispatcher with every middleware and router; also used by loadtest.py"""
     dp = Dispatcher()
     
     # Register middlewares
+    dp.update.middleware(TracingMiddleware()) # Root span and correlation id, around everything else
     dp.update.middleware(StructLoggingMiddleware()) # Must be first to capture context
     dp.update.middleware(DbSessionMiddleware())
     dp.update.middleware(I18nMiddleware())
+    # Inner middlewares on the dispatcher reach handlers in every included router
+    for observer in (dp.message, dp.callback_query, dp.pre_checkout_query):
+        observer.middleware(HandlerLabelMiddleware())
+    metrics.fsm_states.set_function(lambda: metrics.count_fsm_states(dp.storage))
     
     # Register routers (handlers)
     dp.include_router(support.router)
@@ -36,6 +70,11 @@ async def main():
     # dp.include_router(admin.router) # Deprecated
     dp.include_router(admin_panel.router)
     dp.include_router(fallback.router)
+    return dp
+
+async def run():
+    bot = create_bot()
+    dp = create_dispatcher()
 
     if config.webhook_url:
         logger.info("Starting in WEBHOOK mode", url=config.webhook_url)
@@ -50,6 +89,17 @@ async def main():
         app = web.Application()
         # Register Payments Webhook
         app.router.add_post("/payment/webhook/yookassa", handle_yookassa)
+        # Register Remnawave panel events (push cache invalidation)
+        if config.remnawave_webhook_secret:
+            app.router.add_post(config.remnawave_webhook_path, handle_remnawave)
+        # The webhook app is public: only serve /metrics to scrapers that present the token
+        if config.metrics_token:
+            app.router.add_get(config.metrics_path, handle_metrics)
+        else:
+            logger.warning("metrics_disabled", reason="METRICS_TOKEN is not set in webhook mode")
+        if config.profile_token:
+            app["bot"] = bot
+            app.router.add_post(config.profile_path, handle_profile_cpu)
         
         webhook_handler = SimpleRequestHandler(
             dispatcher=dp,
@@ -71,7 +121,12 @@ async def main():
     else:
         logger.info("Starting in POLLING mode")
         await bot.delete_webhook(drop_pending_updates=True)
-        await dp.start_polling(bot)
+        metrics_runner = await start_metrics_server(bot) if config.metrics_port else None
+        try:
+            await dp.start_polling(bot)
+        finally:
+            if metrics_runner:
+                await metrics_runner.cleanup()
 
 if __name__ == "__main__":
     asyncio.run(main())
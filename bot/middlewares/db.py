@@ -1,7 +1,80 @@
+import time
 from typing import Any, Dict, Awaitable, Callable
 from aiogram import BaseMiddleware
 from aiogram.types import Update
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from bot.database.core import async_session
+from bot.utils import metrics
+from bot.utils.tracing import current_span, HANDLER
+import structlog
+
+logger = structlog.get_logger()
+
+class LazySession:
+    """
+    Stands in for the handler's AsyncSession. The real session is only created on first use,
+    so updates that never touch the DB (fallbacks, menus, delete_msg) cost nothing, and the
+    time its transactions hold a pool connection is measured.
+    """
+    __slots__ = ("_session", "handler", "checkouts", "held", "held_max", "_began_at")
+
+    def __init__(self):
+        self._session = None
+        self.handler = "unhandled"
+        self.checkouts = 0
+        self.held = 0.0
+        self.held_max = 0.0
+        self._began_at: float | None = None
+
+    def _get(self):
+        if self._session is None:
+            self._session = async_session()
+            self._session.info["lazy"] = self
+        return self._session
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    @property
+    def opened(self) -> bool:
+        return self._session is not None
+
+    async def release(self):
+        """
+        Ends a read-only transaction so its connection goes back to the pool before the handler
+        moves on to slow work. Loaded objects stay usable (expire_on_commit=False).
+        """
+        s = self._session
+        if s is None or not s.in_transaction() or s.new or s.dirty or s.deleted:
+            return
+        await s.commit()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+@event.listens_for(Session, "after_begin")
+def _connection_checked_out(session, transaction, connection):
+    lazy = session.info.get("lazy")
+    if lazy is not None and lazy._began_at is None:
+        lazy.checkouts += 1
+        lazy._began_at = time.monotonic()
+
+@event.listens_for(Session, "after_transaction_end")
+def _connection_returned(session, transaction):
+    lazy = session.info.get("lazy")
+    if lazy is None or lazy._began_at is None or transaction.parent is not None:
+        return
+    held = time.monotonic() - lazy._began_at
+    lazy._began_at = None
+    lazy.held += held
+    lazy.held_max = max(lazy.held_max, held)
+
+def _record(lazy: LazySession):
+    if lazy.checkouts:
+        metrics.db_handler_checkouts.inc(lazy.checkouts, handler=lazy.handler)
+        metrics.db_handler_held.observe(lazy.held, handler=lazy.handler)
 
 class DbSessionMiddleware(BaseMiddleware):
     async def __call__(
@@ -10,6 +83,33 @@ class DbSessionMiddleware(BaseMiddleware):
         event: Update,
         data: Dict[str, Any],
     ) -> Any:
-        async with async_session() as session:
-            data["session"] = session
+        lazy = LazySession()
+        data["session"] = lazy
+        try:
             return await handler(event, data)
+        finally:
+            await lazy.close()
+            _record(lazy)
+            if lazy.checkouts:
+                logger.debug("db_session_usage", handler=lazy.handler, checkouts=lazy.checkouts,
+                             held=f"{lazy.held:.3f}s", held_max=f"{lazy.held_max:.3f}s")
+
+class HandlerLabelMiddleware(BaseMiddleware):
+    """Inner middleware: tells the update's LazySession and root span which handler it is serving"""
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any],
+    ) -> Any:
+        lazy = data.get("session")
+        handler_obj = data.get("handler")
+        if handler_obj is not None:
+            name = handler_obj.callback.__name__
+            if isinstance(lazy, LazySession):
+                lazy.handler = name
+            root = current_span()
+            if root is not None and root.kind == HANDLER:
+                root.name = name
+        return await handler(event, data)
@@ -2,15 +2,28 @@ from typing import Any, Dict, Awaitable, Callable, Union
 from aiogram import BaseMiddleware
 from aiogram.types import Update, User
 from fluent.runtime import FluentLocalization, FluentResourceLoader
-from bot.database.core import async_session
+from bot.config import config
 from bot.database import models
+from bot.utils.cache import TTLCache, MISSING
+from bot.utils.tracing import span, I18N
 from sqlalchemy import select
 
+# user id -> language code. set_language and cmd_start keep it in step with users.language_code;
+# the TTL only bounds drift from changes made outside this process.
+languages = TTLCache(maxsize=config.i18n_cache_size, ttl=config.i18n_cache_ttl)
+
+class TracedLocalization(FluentLocalization):
+    """FluentLocalization whose formats show up as spans of the current update"""
+
+    def format_value(self, msg_id, args=None):
+        with span(f"i18n {msg_id}", I18N):
+            return super().format_value(msg_id, args)
+
 class I18nMiddleware(BaseMiddleware):
     def __init__(self):
         loader = FluentResourceLoader("bot/services/locales/{locale}")
-        self.l10n_en = FluentLocalization(["en"], ["messages.ftl"], loader)
-        self.l10n_ru = FluentLocalization(["ru"], ["messages.ftl"], loader)
+        self.l10n_en = TracedLocalization(["en"], ["messages.ftl"], loader)
+        self.l10n_ru = TracedLocalization(["ru"], ["messages.ftl"], loader)
 
     async def __call__(
         self,
@@ -23,17 +36,19 @@ class I18nMiddleware(BaseMiddleware):
         if not user:
             return await handler(event, data)
 
-        # Get user language from DB or fallback to Telegram language
-        async with async_session() as session:
-            db_user = await session.scalar(select(models.User).where(models.User.id == user.id))
-            
-            if db_user:
-                lang_code = db_user.language_code
-            else:
-                lang_code = user.language_code if user.language_code == "ru" else "en"
+        lang_code = languages.get(user.id)
+        if lang_code is MISSING:
+            # Get user language from DB (request session from DbSessionMiddleware) or fallback to Telegram language
+            session = data["session"]
+            lang_code = await session.scalar(
+                select(models.User.language_code).where(models.User.id == user.id)
+            )
+            # Don't keep the connection checked out while the handler runs
+            await session.release()
+            if not lang_code:
                 # We do NOT create user here, strict separation, handlers should do get_or_create if needed 
-                # OR we can do it here for convenience. Let's stick to handler logic for creation or explicit middleware.
-                # Actually, for I18n it's better to just know the lang.
+                lang_code = user.language_code if user.language_code == "ru" else "en"
+            languages.set(user.id, lang_code)
         
         # Inject localization
         if lang_code == "ru":
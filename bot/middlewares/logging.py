@@ -1,6 +1,10 @@
 from typing import Callable, Dict, Any, Awaitable
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, Message, CallbackQuery
+from bot.config import config
+from bot.logging_setup import sampled
+from bot.utils import metrics
+from bot.utils.tracing import breakdown
 import structlog
 import time
 
@@ -38,27 +42,41 @@ class StructLoggingMiddleware(BaseMiddleware):
             event_type = "callback"
             event_details["data"] = event.data
 
-        # 3. Log Start
+        # 3. Log Start (sampled: one decision per update so started/finished stay paired)
+        keep = sampled(config.log_update_sample_rate)
         start_time = time.time()
-        logger.info(
-            "update_started", 
-            event_type=event_type, 
-            **event_details
-        )
+        if keep:
+            logger.info(
+                "update_started", 
+                event_type=event_type, 
+                **event_details
+            )
         
         try:
             # 4. Process Handler
             result = await handler(event, data)
             
-            # 5. Log Success
+            # 5. Log Success (slow updates always, with what they were about)
             process_time = time.time() - start_time
-            logger.info("update_finished", duration=f"{process_time:.3f}s")
+            if process_time >= config.log_slow_update_threshold:
+                # Where the time went (zeros when the update was not traced)
+                spent = {kind: f"{t:.3f}s" for kind, t in breakdown().items()}
+                logger.warning("update_slow", duration=f"{process_time:.3f}s", event_type=event_type, **spent, **event_details)
+            elif keep:
+                logger.info("update_finished", duration=f"{process_time:.3f}s")
             return result
             
         except Exception as e:
             # 6. Log Error
             logger.error("update_failed", error=str(e), exc_info=True)
+            metrics.update_errors.inc(handler=self._handler_name(data))
             raise e
         finally:
-            # 7. Cleanup Context
+            # 7. Metrics and Cleanup Context
+            metrics.update_duration.observe(time.time() - start_time, handler=self._handler_name(data))
             structlog.contextvars.clear_contextvars()
+
+    @staticmethod
+    def _handler_name(data: Dict[str, Any]) -> str:
+        # Labelled on the update's LazySession by HandlerLabelMiddleware
+        return getattr(data.get("session"), "handler", "unhandled")
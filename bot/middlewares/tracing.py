@@ -0,0 +1,37 @@
+from typing import Any, Dict, Awaitable, Callable
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import Update
+from bot.utils.tracing import trace_update, span, TELEGRAM
+import structlog
+
+class TracingMiddleware(BaseMiddleware):
+    """
+    Outermost update middleware: opens the update's root span and binds its correlation id
+    to the log context. HandlerLabelMiddleware renames the span after the handler that ran.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        with trace_update("unhandled", update_id=event.update_id, event_type=event.event_type) as root:
+            if root is not None:
+                structlog.contextvars.bind_contextvars(trace_id=root.trace.trace_id)
+            return await handler(event, data)
+
+class TelegramTracingMiddleware(BaseRequestMiddleware):
+    """Bot session middleware: one span per Bot API call made while handling an update"""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ):
+        with span(f"telegram {type(method).__name__}", TELEGRAM):
+            return await make_request(bot, method)
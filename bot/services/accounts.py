@@ -0,0 +1,240 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from sqlalchemy import select, delete, update, or_
+from sqlalchemy.dialects.postgresql import insert
+from bot.config import config
+from bot.database import models
+from bot.database.core import async_session
+from bot.services.remnawave import api, panel_priority, PRIORITY_BACKGROUND, Account, parse_dt
+from bot.services.settings import SettingsService
+import structlog
+
+logger = structlog.get_logger()
+
+CURSOR_KEY = "rw_accounts_cursor"
+UPSERT_BATCH = 500
+
+def _naive(dt: datetime | None) -> datetime | None:
+    # Stored naive UTC, like every other DateTime column
+    return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt else None
+
+def _to_row(u: dict) -> dict:
+    traffic = u.get('userTraffic') or {}
+    tid = u.get('telegramId')
+    return {
+        "uuid": u['uuid'],
+        "username": u.get('username') or "",
+        "telegram_id": int(tid) if tid not in (None, "") else None,
+        "expire_at": _naive(parse_dt(u.get('expireAt'))),
+        "traffic_limit_bytes": int(u.get('trafficLimitBytes') or u.get('dataLimit') or 0),
+        "traffic_used_bytes": int(traffic.get('usedTrafficBytes') or u.get('usedTrafficBytes') or 0),
+        "tag": u.get('tag'),
+        "subscription_url": u.get('subscriptionUrl'),
+        "updated_at": _naive(parse_dt(u.get('updatedAt'))),
+        "synced_at": datetime.utcnow(),
+    }
+
+def to_account(row: models.RemnawaveAccount) -> Account:
+    """Mirror row as the same typed record the panel client returns"""
+    return Account(
+        uuid=row.uuid,
+        username=row.username,
+        telegram_id=row.telegram_id,
+        expire_at=row.expire_at.replace(tzinfo=timezone.utc) if row.expire_at else None,
+        traffic_limit_bytes=row.traffic_limit_bytes,
+        traffic_used_bytes=row.traffic_used_bytes,
+        tag=row.tag,
+        subscription_url=row.subscription_url,
+    )
+
+class AccountMirror:
+    """
+    Keeps the remnawave_accounts table in step with the panel.
+    The panel has no updated-since filter, so each sync is a paginated crawl
+    that only writes rows whose updatedAt moved past the stored cursor
+    (or whose traffic counter changed).
+    """
+
+    def __init__(self):
+        self._synced_at: float | None = None
+        self._cursor: datetime | None = None
+        self._task: asyncio.Task | None = None
+
+    async def _upsert(self, session, rows: list[dict], only_newer: bool = False):
+        stmt = insert(models.RemnawaveAccount).values(rows)
+        ra = models.RemnawaveAccount
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['uuid'],
+            set_={c: stmt.excluded[c] for c in rows[0] if c != "uuid"},
+            # Out-of-band writes must not replace a row the panel has since updated
+            where=or_(ra.updated_at.is_(None), stmt.excluded.updated_at.is_(None), stmt.excluded.updated_at >= ra.updated_at) if only_newer else None,
+        )
+        await session.execute(stmt)
+
+    async def remember(self, payload: dict):
+        """Write-through for users the bot just created or changed"""
+        data = payload.get('response', payload) if isinstance(payload, dict) else None
+        if not isinstance(data, dict) or not data.get('uuid'):
+            return
+        try:
+            async with async_session() as session:
+                await self._upsert(session, [_to_row(data)], only_newer=True)
+                await session.commit()
+        except Exception as e:
+            logger.error("account_mirror_write_failed", uuid=data.get('uuid'), error=str(e))
+
+    async def updated_at(self, uuid: str) -> datetime | None:
+        """Panel updatedAt of the mirrored row (aware UTC), None if not mirrored"""
+        try:
+            async with async_session() as session:
+                value = await session.scalar(select(models.RemnawaveAccount.updated_at).where(models.RemnawaveAccount.uuid == uuid))
+        except Exception as e:
+            logger.error("account_mirror_read_failed", uuid=uuid, error=str(e))
+            return None
+        return value.replace(tzinfo=timezone.utc) if value else None
+
+    async def forget(self, uuid: str):
+        try:
+            async with async_session() as session:
+                await session.execute(delete(models.RemnawaveAccount).where(models.RemnawaveAccount.uuid == uuid))
+                await self._drop_snapshots(session, [uuid])
+                await session.commit()
+        except Exception as e:
+            logger.error("account_mirror_write_failed", uuid=uuid, error=str(e))
+
+    async def _push_snapshots(self, session, uuid: str | None = None) -> int:
+        # Copy mirror rows onto linked users whose subscription snapshot differs, in one statement
+        ra = models.RemnawaveAccount
+        u = models.User
+        stmt = (
+            update(u)
+            .where(u.remnawave_uuid == ra.uuid)
+            .where(or_(
+                u.sub_synced_at.is_(None),
+                u.sub_expire_at.is_distinct_from(ra.expire_at),
+                u.sub_traffic_limit_bytes.is_distinct_from(ra.traffic_limit_bytes),
+                u.sub_traffic_used_bytes.is_distinct_from(ra.traffic_used_bytes),
+                u.sub_url.is_distinct_from(ra.subscription_url),
+            ))
+            .values(
+                sub_expire_at=ra.expire_at,
+                sub_traffic_limit_bytes=ra.traffic_limit_bytes,
+                sub_traffic_used_bytes=ra.traffic_used_bytes,
+                sub_url=ra.subscription_url,
+                sub_synced_at=ra.synced_at,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if uuid:
+            stmt = stmt.where(ra.uuid == uuid)
+        return (await session.execute(stmt)).rowcount
+
+    async def _drop_snapshots(self, session, uuids: list[str]):
+        # Account is gone from the panel: make readers ask the panel again
+        await session.execute(
+            update(models.User).where(models.User.remnawave_uuid.in_(uuids)).values(sub_synced_at=None)
+        )
+
+    async def push_snapshots(self, uuid: str | None = None):
+        """Refreshes users' subscription snapshots from the mirror (all, or one account)"""
+        try:
+            async with async_session() as session:
+                await self._push_snapshots(session, uuid)
+                await session.commit()
+        except Exception as e:
+            logger.error("subscription_snapshot_push_failed", uuid=uuid, error=str(e))
+
+    async def sync(self):
+        if self._cursor is None:
+            self._cursor = parse_dt(await SettingsService.get_setting(CURSOR_KEY))
+        cursor = self._cursor
+        newest = cursor
+        seen = set()
+        changed = 0
+        removed = 0
+        listing = {}
+        started = datetime.utcnow()
+        ra = models.RemnawaveAccount
+
+        async with async_session() as session:
+            async for page in api.iter_user_pages(strict=True, listing=listing):
+                users = [u for u in page if u.get('uuid')]
+                uuids = [u['uuid'] for u in users]
+                seen.update(uuids)
+                # Traffic counters move without bumping updatedAt, so compare those directly (this page only)
+                local_used = dict((await session.execute(select(ra.uuid, ra.traffic_used_bytes).where(ra.uuid.in_(uuids)))).all())
+                batch = []
+                for u in users:
+                    updated = parse_dt(u.get('updatedAt'))
+                    if updated and (newest is None or updated > newest):
+                        newest = updated
+                    row = _to_row(u)
+                    if cursor is None or updated is None or updated >= cursor or local_used.get(u['uuid']) != row["traffic_used_bytes"]:
+                        batch.append(row)
+                for i in range(0, len(batch), UPSERT_BATCH):
+                    # The page may be older than a write-through that landed meanwhile: never roll that back
+                    await self._upsert(session, batch[i:i + UPSERT_BATCH], only_newer=True)
+                changed += len(batch)
+                await session.commit() # One short transaction per page
+
+            # Offset paging skips users when the panel list shifts mid-crawl, and a skipped user
+            # must not be deleted: only trust absences when the crawl saw exactly the reported total
+            if listing.get("total") == len(seen):
+                local = (await session.scalars(select(ra.uuid).where(ra.synced_at < started))).all()
+                gone = [uuid for uuid in local if uuid not in seen]
+                for i in range(0, len(gone), UPSERT_BATCH):
+                    await session.execute(delete(ra).where(ra.uuid.in_(gone[i:i + UPSERT_BATCH])))
+                    await self._drop_snapshots(session, gone[i:i + UPSERT_BATCH])
+                removed = len(gone)
+                await session.commit()
+            else:
+                logger.warning("account_mirror_deletes_skipped", reported=listing.get("total"), seen=len(seen))
+
+            # Background refresh of the per-user subscription snapshot
+            snapshots = await self._push_snapshots(session)
+            await session.commit()
+
+        if newest:
+            await SettingsService.set_setting(CURSOR_KEY, newest.isoformat())
+        self._cursor = newest
+        self._synced_at = time.monotonic()
+        logger.info("account_mirror_synced", total=len(seen), changed=changed, removed=removed, snapshots=snapshots)
+
+    async def find_by_telegram_id(self, user_id: int) -> list[Account]:
+        async with async_session() as session:
+            rows = await session.scalars(select(models.RemnawaveAccount).where(or_(
+                models.RemnawaveAccount.telegram_id == user_id,
+                models.RemnawaveAccount.username == f"tg_{user_id}"
+            )))
+            return [to_account(r) for r in rows]
+
+    @property
+    def ready(self) -> bool:
+        """Synced by this process recently enough to answer lookups instead of the panel"""
+        return self._synced_at is not None and time.monotonic() - self._synced_at <= config.remnawave_mirror_max_age
+
+    async def start(self):
+        # Rows left by an earlier process can be any age: wait for this process's first sync
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._sync_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _sync_loop(self):
+        while True:
+            try:
+                with panel_priority(PRIORITY_BACKGROUND):
+                    await self.sync()
+            except Exception as e:
+                logger.error("account_mirror_sync_failed", error=str(e))
+            await asyncio.sleep(config.remnawave_mirror_sync_interval)
+
+mirror = AccountMirror()
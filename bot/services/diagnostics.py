@@ -0,0 +1,48 @@
+import asyncio
+from datetime import datetime, timezone
+from html import escape
+from aiogram import Bot
+from aiogram.types import BufferedInputFile
+from bot.config import config
+from bot.utils.profiler import profiler, collapsed, top_frames, ProfilerBusy
+import structlog
+
+logger = structlog.get_logger()
+
+_tasks: set[asyncio.Task] = set()
+
+def start_cpu_profile(bot: Bot, seconds: float, requested_by: str) -> bool:
+    """Starts a capture in the background; False if one is already running"""
+    # The pending task counts too: profiler.running only flips once it gets scheduled
+    if profiler.running or _tasks:
+        return False
+    task = asyncio.create_task(_profile_and_post(bot, seconds, requested_by))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return True
+
+async def _profile_and_post(bot: Bot, seconds: float, requested_by: str):
+    logger.info("cpu_profile_started", seconds=seconds, requested_by=requested_by)
+    try:
+        stacks, samples = await profiler.capture(seconds, config.profile_sample_interval)
+    except ProfilerBusy:
+        return
+    logger.info("cpu_profile_finished", seconds=seconds, samples=samples, stacks=len(stacks))
+
+    finished = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    lines = [f"⏱ <b>CPU profile</b>: {seconds:g} s, {samples} samples (requested by {escape(requested_by)})"]
+    for frame, count in top_frames(stacks):
+        lines.append(f"{count * 100 / max(samples, 1):.0f}% <code>{escape(frame)}</code>")
+    caption = "\n".join(lines)
+    while len(caption) > 1024 and len(lines) > 1:
+        lines.pop()
+        caption = "\n".join(lines)
+    try:
+        await bot.send_document(
+            config.admin_group_id,
+            BufferedInputFile(collapsed(stacks) or b"# no samples\n", filename=f"cpu-{finished}.collapsed"),
+            caption=caption,
+            parse_mode="HTML",
+        )
+    except Exception as e:
+        logger.error("cpu_profile_send_failed", error=str(e))
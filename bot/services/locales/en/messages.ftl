@@ -174,6 +174,8 @@ admin-set-traffic-success = ✅ Set: { $val } GB
 admin-set-traffic-error = ❌ Please enter a number (float allowed).
 admin-ask-squad = Enter new Squad UUID:
 admin-set-squad-success = ✅ Set Squad UUID: { $val }
+admin-squad-unknown = ❌ Squad { $val } not found on the panel. Pick one below or enter a valid UUID.
+admin-squad-default-btn = Default (no squad)
 
 # Misc
 admin-deleted = ✅ Deleted
@@ -217,6 +219,9 @@ admin-t-grant-success-full =
     { $link }
 admin-t-grant-error = ❌ [DEBUG] Failed to grant: { $error }
 admin-t-grant-user-not-found = ❌ User with ID { $id } not found in bot database. Ask them to /start first.
+admin-profile-usage = Usage: /profile_cpu <seconds> (1–{ $max })
+admin-profile-started = ⏱ Profiling CPU for { $seconds } s. The collapsed stacks will be posted to the admin group.
+admin-profile-busy = ⏳ A CPU profile is already being recorded.
 
 # Shop
 shop-no-tariffs = 😔 No plans available at the moment.
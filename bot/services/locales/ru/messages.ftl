@@ -176,6 +176,8 @@ admin-set-traffic-success = ✅ Установлено: { $val } GB
 admin-set-traffic-error = ❌ Нужно ввести число (можно дробное, через точку).
 admin-ask-squad = Введите новый Squad UUID:
 admin-set-squad-success = ✅ Установлено Squad UUID: { $val }
+admin-squad-unknown = ❌ Отряд { $val } не найден в панели. Выберите из списка или введите верный UUID.
+admin-squad-default-btn = По умолчанию (без отряда)
 
 # Misc
 admin-deleted = ✅ Удалено
@@ -219,6 +221,9 @@ admin-t-grant-success-full =
     { $link }
 admin-t-grant-error = ❌ Ошибка выдачи: { $error }
 admin-t-grant-user-not-found = ❌ Пользователь с ID { $id } не найден в базе бота. Попросите его сначала нажать /start.
+admin-profile-usage = Использование: /profile_cpu <секунды> (1–{ $max })
+admin-profile-started = ⏱ Профилирование CPU на { $seconds } с. Стеки будут отправлены в группу админов.
+admin-profile-busy = ⏳ Профиль CPU уже записывается.
 
 # Shop
 shop-no-tariffs = 😔 Нет доступных тарифов.
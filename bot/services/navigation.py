@@ -0,0 +1,39 @@
+import secrets
+from typing import Any
+from bot.config import config
+from bot.utils.cache import TTLCache
+
+class NavigationStore:
+    """
+    Short-lived, per-user context behind compact callback tokens.
+    Callback data is capped at 64 bytes, so buttons carry an 8-char token while the full
+    account UUID / HWID the screen was built from stay here. Tokens are scoped to the
+    Telegram user that received them, so a forged or forwarded token resolves to nothing.
+    """
+
+    def __init__(self):
+        self._items = TTLCache(maxsize=config.nav_context_size, ttl=config.nav_context_ttl)
+        # user_id -> panel account uuids that user may open device screens for
+        self._accounts = TTLCache(maxsize=config.nav_context_size, ttl=config.nav_context_ttl)
+
+    def put(self, user_id: int, value: Any) -> str:
+        while True:
+            token = secrets.token_hex(4)
+            if (user_id, token) not in self._items:
+                break
+        self._items.set((user_id, token), value)
+        return token
+
+    def get(self, user_id: int, token: str) -> Any:
+        return self._items.get((user_id, token), None)
+
+    def drop(self, user_id: int, token: str):
+        self._items.pop((user_id, token))
+
+    def set_accounts(self, user_id: int, uuids: set[str]):
+        self._accounts.set(user_id, uuids)
+
+    def accounts(self, user_id: int) -> set[str] | None:
+        return self._accounts.get(user_id, None)
+
+nav = NavigationStore()
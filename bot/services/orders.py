@@ -1,8 +1,17 @@
 from bot.database import models
 from bot.database.core import async_session
-from bot.services.remnawave import api
+from bot.services.remnawave import api, panel_priority, PRIORITY_PAYMENT, Account
+from bot.services.accounts import mirror
+from bot.services.profiles import profiles
+from bot.services.squads import catalog
+from bot.services.subscriptions import apply_snapshot
+from bot.utils import metrics
 from sqlalchemy import select
-from datetime import datetime
+import aiohttp
+from sqlalchemy.orm import joinedload
+from datetime import datetime, timedelta, timezone
+from dateutil import parser
+import time
 import structlog
 
 logger = structlog.get_logger()
@@ -19,181 +28,212 @@ async def create_order(user_id: int, tariff_id: int, amount: float, provider: st
     await session.commit()
     return order
 
-async def fulfill_order(order_id: int, session, payment_id: str = None) -> bool:
-    order = await session.get(models.Order, order_id)
+def _unwrap(resp):
+    if isinstance(resp, dict) and isinstance(resp.get('response'), dict):
+        return resp['response']
+    return resp or {}
+
+def plan_fulfillment(rw_user: dict, is_trial: bool, traffic_gb, duration_days, squad_uuid: str | None) -> dict:
+    """
+    Computes the single PATCH that applies a tariff on top of the current panel snapshot:
+    tag, traffic, expiry and squad all go out together.
+    """
+    updates = {
+        "onHold": False
+    }
+
+    # Tags
+    # Docs confirm 'tag' is a string.
+    current_tags = rw_user.get('tag') or ""
+    if is_trial and "TRIAL_YES" not in current_tags:
+        updates["tag"] = f"{current_tags},TRIAL_YES" if current_tags else "TRIAL_YES"
+
+    # Traffic
+    if traffic_gb:
+        current_limit = rw_user.get('trafficLimitBytes', 0) or 0
+        bytes_to_add = int(traffic_gb * 1024 * 1024 * 1024)
+        updates["trafficLimitBytes"] = int(current_limit) + bytes_to_add
+        updates["trafficLimitStrategy"] = "NO_RESET"
+
+    # Duration: extend from current expiry if still active, else from now
+    if duration_days:
+        now_ts = time.time()
+        base_ts = now_ts
+        current_expire = rw_user.get('expireAt')
+        if current_expire:
+            try:
+                ts = parser.isoparse(current_expire).timestamp()
+                if ts > now_ts:
+                    base_ts = ts
+            except Exception:
+                pass
+
+        new_expire_dt = datetime.fromtimestamp(base_ts, tz=timezone.utc) + timedelta(days=duration_days)
+        updates["expireAt"] = new_expire_dt.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+    # Squad
+    if squad_uuid:
+        updates["activeInternalSquads"] = [squad_uuid]
+
+    return updates
+
+async def fulfill_order(order_id: int, session, payment_id: str = None) -> dict | None:
+    """
+    Provisions/extends the panel user for a paid order.
+    Returns the post-update panel user (truthy) on success, None otherwise,
+    so callers can show the subscription link without another round trip.
+    """
+    # Fulfillment jumps ahead of profile reads in the outbound panel queue
+    started = time.monotonic()
+    try:
+        with panel_priority(PRIORITY_PAYMENT):
+            return await _fulfill_order(order_id, session, payment_id)
+    finally:
+        metrics.fulfillment_duration.observe(time.monotonic() - started)
+
+async def _provision_user(user: models.User) -> dict | None:
+    """Creates tg_{id} on the panel or relinks an existing one. Returns its snapshot."""
+    logger.info("provisioning_new_user", username=f"tg_{user.id}")
+    try:
+        resp = await api.create_user(user.id, user.username)
+        data = _unwrap(resp)
+        rw_uuid = data.get('uuid') or data.get('id')
+        if rw_uuid:
+            user.remnawave_uuid = rw_uuid
+            logger.info("user_created_successfully", uuid=rw_uuid)
+            return data
+        logger.error("provisioning_failed_no_uuid", response="API response missing UUID")
+        return None
+    except Exception as e:
+        # Creation failed, might already exist
+        logger.info("user_creation_failed_checking_existing", error=str(e))
+
+    # Recover
+    logger.debug("searching_user_by_username", username=f"tg_{user.id}")
+    users = await api.get_users(search=f"tg_{user.id}")
+
+    # Handle various API response formats
+    candidates = []
+    if isinstance(users, list): candidates = users
+    elif isinstance(users, dict):
+         if 'users' in users: candidates = users['users']
+         elif 'data' in users: candidates = users['data']
+         elif 'items' in users: candidates = users['items']
+         elif 'response' in users and 'users' in users['response']: candidates = users['response']['users']
+
+    for u in candidates:
+         if u.get('username') == f"tg_{user.id}":
+             rw_uuid = u.get('uuid') or u.get('id')
+             user.remnawave_uuid = rw_uuid
+             logger.info("user_recovered_successfully", uuid=rw_uuid, details="Found existing user, relinking.")
+             # Search results can be trimmed; read the full record once
+             return _unwrap(await api.get_user(rw_uuid, fresh=True))
+
+    logger.error("provisioning_failed_fatal", user_id=user.id, details="Could not create nor find user.")
+    return None
+
+async def _fulfill_order(order_id: int, session, payment_id: str = None) -> dict | None:
+    # Order, user and tariff in one round trip
+    order = await session.scalar(
+        select(models.Order)
+        .options(joinedload(models.Order.user), joinedload(models.Order.tariff))
+        .where(models.Order.id == order_id)
+    )
     if not order or order.status == models.OrderStatus.PAID:
-        return False
+        metrics.fulfillments.inc(outcome="skipped")
+        return None
         
     if payment_id:
         order.invoice_id = payment_id
     
-    user = await session.get(models.User, order.user_id)
-    tariff = await session.get(models.Tariff, order.tariff_id)
+    user = order.user
+    tariff = order.tariff
     
     logger.info("fulfillment_started", order_id=order_id, user_id=user.id, tariff=tariff.name, is_trial=tariff.is_trial)
     
     try:
-        # Check if user exists in Remnawave
-        rw_uuid = user.remnawave_uuid
-        
-        # 1. Self-healing check
-        if rw_uuid:
-             logger.info("verifying_user_existence", uuid=rw_uuid)
+        # 1. Snapshot: one fresh read doubles as the self-healing existence check
+        rw_user = None
+        if user.remnawave_uuid:
+             logger.debug("verifying_user_existence", uuid=user.remnawave_uuid)
              try:
-                 await api.get_user(rw_uuid)
-                 logger.info("user_verified_in_remnawave", uuid=rw_uuid)
-             except Exception:
+                 rw_user = _unwrap(await api.get_user(user.remnawave_uuid, fresh=True))
+                 logger.debug("user_verified_in_remnawave", uuid=user.remnawave_uuid)
+             except Exception as e:
+                 # Only a definite 404 means the user is gone; an outage must not trigger re-provisioning
+                 if getattr(e, 'status', None) != 404:
+                     raise
                  logger.info("user_not_found_on_remote", details="Local UUID invalid or user deleted. clearing_local_data_to_reprovision")
-                 rw_uuid = None
                  user.remnawave_uuid = None
 
         # 2. User Provisioning
-        if not rw_uuid:
-            logger.info("provisioning_new_user", username=f"tg_{user.id}")
-            try:
-                resp = await api.create_user(user.id, user.username)
-                if resp:
-                    if 'response' in resp:
-                        rw_uuid = resp['response'].get('uuid') or resp['response'].get('id')
-                    else:
-                        rw_uuid = resp.get('uuid') or resp.get('id')
-                    
-                    user.remnawave_uuid = rw_uuid
-                    logger.info("user_created_successfully", uuid=rw_uuid)
-            except Exception as e:
-                # Creation failed, might already exist
-                logger.info("user_creation_failed_checking_existing", error=str(e))
-                
-                # Recover
-                logger.info("searching_user_by_username", username=f"tg_{user.id}")
-                users = await api.get_users(search=f"tg_{user.id}")
-
-                found_user = None
-                # Handle various API response formats
-                candidates = []
-                if isinstance(users, list): candidates = users
-                elif isinstance(users, dict):
-                     if 'users' in users: candidates = users['users']
-                     elif 'data' in users: candidates = users['data']
-                     elif 'items' in users: candidates = users['items']
-                     elif 'response' in users and 'users' in users['response']: candidates = users['response']['users']
-                
-                for u in candidates:
-                     if u.get('username') == f"tg_{user.id}":
-                         found_user = u
-                         break
-                
-                if found_user:
-                    rw_uuid = found_user.get('uuid') or found_user.get('id')
-                    user.remnawave_uuid = rw_uuid
-                    logger.info("user_recovered_successfully", uuid=rw_uuid, details="Found existing user, relinking.")
-                else:
-                    logger.error("provisioning_failed_fatal", user_id=user.id, details="Could not create nor find user.")
-                    return False
-            
-            if not rw_uuid:
-                 logger.error("provisioning_failed_no_uuid", response="API response missing UUID")
-                 return False
+        if rw_user is None:
+            rw_user = await _provision_user(user)
+            if not rw_user:
+                metrics.fulfillments.inc(outcome="provision_failed")
+                return None
+        rw_uuid = user.remnawave_uuid
 
         # 3. Applying Settings (Tariff logic)
-        
-        # Override values if Trial
         target_traffic_gb = tariff.traffic_limit_gb
         target_duration_days = tariff.duration_days
+        target_squad_uuid = tariff.squad_uuid
         
+        # Override values if Trial
         if tariff.is_trial:
              from bot.services.settings import SettingsService
              try:
                  settings = await SettingsService.get_trial_settings()
                  target_traffic_gb = settings.get('traffic', target_traffic_gb)
                  target_duration_days = settings.get('days', target_duration_days)
-                 # squad uuid is handled below
-                 logger.info("using_dynamic_trial_settings", traffic=target_traffic_gb, days=target_duration_days)
+                 target_squad_uuid = settings.get('squad_uuid')
+                 logger.debug("using_dynamic_trial_settings", traffic=target_traffic_gb, days=target_duration_days)
              except Exception as e:
                  logger.error("failed_to_load_settings", error=str(e))
 
-        logger.info("applying_tariff_settings", uuid=rw_uuid, tariff_limit=target_traffic_gb, duration=target_duration_days)
-        
-        # Optimization: Fetch user ONCE and calculate all updates
-        rw_user = await api.get_user(rw_uuid)
-        current_tags = rw_user.get('tag') or ""
-        
-        if tariff.is_trial and "TRIAL_YES" in current_tags:
+        if target_squad_uuid in ("", "0", "None"):
+             target_squad_uuid = None
+        if target_squad_uuid and not catalog.is_known(target_squad_uuid):
+            # A deleted squad must not block a paid order: apply the rest, an admin fixes the tariff
+            logger.error("fulfillment_squad_unknown", order_id=order_id, squad_uuid=target_squad_uuid, tariff_id=tariff.id)
+            target_squad_uuid = None
+
+        if tariff.is_trial and "TRIAL_YES" in (rw_user.get('tag') or ""):
              logger.warning("fulfillment_rejected", reason="Trial already used (tag found)")
-             return False
+             metrics.fulfillments.inc(outcome="trial_rejected")
+             return None
 
-        # Prepare update payload
-        updates = {
-            "onHold": False
-        }
+        logger.debug("applying_tariff_settings", uuid=rw_uuid, tariff_limit=target_traffic_gb, duration=target_duration_days, squad_uuid=target_squad_uuid)
 
-        # Tags
-        # Docs confirm 'tag' is a string.
-        if tariff.is_trial:
-             new_tag_val = f"{current_tags},TRIAL_YES" if current_tags else "TRIAL_YES"
-             if "TRIAL_YES" not in current_tags:
-                 updates["tag"] = new_tag_val
-
-        # Traffic
-        if target_traffic_gb:
-             current_limit = rw_user.get('trafficLimitBytes', 0) or 0
-             bytes_to_add = int(target_traffic_gb * 1024 * 1024 * 1024)
-             updates["trafficLimitBytes"] = int(current_limit) + bytes_to_add
-             updates["trafficLimitStrategy"] = "NO_RESET"
-        
-        # Duration
-        if target_duration_days:
-             current_expire = rw_user.get('expireAt')
-             import time
-             from datetime import datetime, timedelta
-             from dateutil import parser
-             
-             now_ts = time.time()
-             base_ts = now_ts
-             
-             if current_expire:
-                 try:
-                     dt = parser.isoparse(current_expire)
-                     ts = dt.timestamp()
-                     if ts > now_ts:
-                         base_ts = ts
-                 except Exception:
-                     pass
-             
-             new_expire_dt = datetime.fromtimestamp(base_ts) + timedelta(days=target_duration_days)
-             updates["expireAt"] = new_expire_dt.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
-
-        # Apply updates
-        update_resp = await api.update_user(rw_uuid, updates)
-        logger.info("settings_applied_successfully", uuid=rw_uuid, response_tags=update_resp.get('tag') or update_resp.get('tags'), updates=updates)
-
-        # 4. Squad Assignment
-        # 4. Squad Assignment
-        target_squad_uuid = None
-        
-        if tariff.is_trial:
-             from bot.services.settings import SettingsService
-             try:
-                 target_squad_uuid = await SettingsService.get_setting("trial_squad_uuid")
-             except:
-                 pass
-        elif tariff.squad_uuid:
-             target_squad_uuid = tariff.squad_uuid
-             
-        if target_squad_uuid:
-             try:
-                await api.add_user_to_squad(rw_uuid, target_squad_uuid)
-                logger.info("user_added_to_squad", squad_uuid=target_squad_uuid)
-             except Exception as e:
-                logger.error("squad_assignment_failed", error=str(e))
+        # 4. One PATCH for tag, traffic, expiry and squad
+        updates = plan_fulfillment(rw_user, tariff.is_trial, target_traffic_gb, target_duration_days, target_squad_uuid)
+        try:
+            update_resp = await api.update_user(rw_uuid, updates)
+        except aiohttp.ClientResponseError as e:
+            # The catalog can lag behind the panel; a rejected squad should not fail the whole order
+            if e.status != 400 or "activeInternalSquads" not in updates:
+                raise
+            logger.error("fulfillment_squad_rejected", order_id=order_id, squad_uuid=target_squad_uuid, error=str(e))
+            updates.pop("activeInternalSquads")
+            update_resp = await api.update_user(rw_uuid, updates)
+        updated_user = _unwrap(update_resp)
+        logger.debug("settings_applied_successfully", uuid=rw_uuid, response_tags=updated_user.get('tag'), updates=updates)
+        await mirror.remember(update_resp)
+        profiles.invalidate(user.id)
+        # PATCH echoes the full user; fall back to the pre-update snapshot if it did not
+        result = updated_user if updated_user.get('uuid') else {**rw_user, **updates, "uuid": rw_uuid}
 
         user.is_trial_used = True
+        user.current_tariff_id = tariff.id
+        apply_snapshot(user, Account.from_payload(result))
         
         order.status = models.OrderStatus.PAID
         await session.commit()
         logger.info("order_fulfilled_complete", order_id=order_id, user_id=user.id)
-        return True
+        metrics.fulfillments.inc(outcome="fulfilled")
+        return result
         
     except Exception as e:
         logger.error("fulfillment_crashed", order_id=order_id, error=str(e))
-        return False
+        metrics.fulfillments.inc(outcome="crashed")
+        return None
@@ -0,0 +1,126 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+from aiogram import types
+from bot.config import config
+from bot.database.core import async_session
+from bot.utils.cache import TTLCache, MISSING
+import structlog
+
+logger = structlog.get_logger()
+
+class ProfileView:
+    """
+    One rendered profile screen.
+    complete is False when a panel call failed and the text was rendered without that data.
+    """
+    __slots__ = ("text", "kb", "account_uuids", "complete")
+
+    def __init__(self, text: str, kb: types.InlineKeyboardMarkup, account_uuids: set[str], complete: bool = True):
+        self.text = text
+        self.kb = kb
+        self.account_uuids = account_uuids
+        self.complete = complete
+
+Renderer = Callable[[object], Awaitable[ProfileView | None]]
+
+class ProfileCache:
+    """
+    Rendered profiles per (telegram user, locale).
+    A copy younger than profile_cache_ttl is served as is. An older one is still served immediately
+    while a single background task re-renders it (stale-while-revalidate), and it stands in for
+    renders that lost the panel (stale-if-error), until profile_cache_max_stale.
+    """
+
+    def __init__(self):
+        # user_id -> {locale: (rendered_at, ProfileView)}
+        self._entries = TTLCache(maxsize=config.profile_cache_size, ttl=config.profile_cache_max_stale)
+        # panel uuid -> user ids whose profile shows that account
+        self._owners = TTLCache(maxsize=config.profile_cache_size, ttl=config.profile_cache_max_stale)
+        self._refreshing: dict[tuple[int, str], asyncio.Task] = {}
+        # Write counter; a render that started before the last write to its user or one of
+        # its accounts is not stored. Per key, so a write for one user leaves other renders alone.
+        self._write_gen = 0
+        self._user_written = TTLCache(maxsize=config.profile_cache_size, ttl=config.profile_cache_max_stale)
+        self._account_written = TTLCache(maxsize=config.profile_cache_size, ttl=config.profile_cache_max_stale)
+
+    def _lookup(self, user_id: int, locale: str):
+        per_user = self._entries.get(user_id)
+        if per_user is MISSING:
+            return None
+        return per_user.get(locale)
+
+    def _written_since(self, user_id: int, account_uuids: set[str], gen: int) -> bool:
+        if self._user_written.get(user_id, 0) > gen:
+            return True
+        return any(self._account_written.get(uuid, 0) > gen for uuid in account_uuids)
+
+    def _store(self, user_id: int, locale: str, view: ProfileView, gen: int):
+        if not view.complete or self._written_since(user_id, view.account_uuids, gen):
+            return
+        per_user = self._entries.get(user_id)
+        if per_user is MISSING:
+            per_user = {}
+        per_user[locale] = (time.monotonic(), view)
+        self._entries.set(user_id, per_user)
+        for uuid in view.account_uuids:
+            owners = self._owners.get(uuid)
+            if owners is MISSING:
+                owners = set()
+            owners.add(user_id)
+            self._owners.set(uuid, owners)
+
+    async def get(self, user_id: int, locale: str, render: Renderer, session) -> ProfileView | None:
+        cached = self._lookup(user_id, locale)
+        if cached:
+            rendered_at, view = cached
+            if time.monotonic() - rendered_at >= config.profile_cache_ttl:
+                self._revalidate(user_id, locale, render)
+            return view
+
+        gen = self._write_gen
+        view = await render(session)
+        if view is None:
+            return None
+        self._store(user_id, locale, view, gen)
+        return view
+
+    def _revalidate(self, user_id: int, locale: str, render: Renderer):
+        key = (user_id, locale)
+        task = self._refreshing.get(key)
+        if task and not task.done():
+            return
+        self._refreshing[key] = asyncio.create_task(self._refresh(user_id, locale, render))
+
+    async def _refresh(self, user_id: int, locale: str, render: Renderer):
+        # The update that triggered this is gone by now, so use a session of our own
+        gen = self._write_gen
+        try:
+            async with async_session() as session:
+                view = await render(session)
+            if view is None:
+                self.invalidate(user_id)
+            elif view.complete:
+                self._store(user_id, locale, view, gen)
+            else:
+                # Panel trouble: keep serving the stale copy
+                logger.warning("profile_refresh_incomplete", user_id=user_id)
+        except Exception as e:
+            logger.error("profile_refresh_failed", user_id=user_id, error=str(e))
+        finally:
+            self._refreshing.pop((user_id, locale), None)
+
+    def invalidate(self, user_id: int):
+        self._write_gen += 1
+        self._user_written.set(user_id, self._write_gen)
+        self._entries.pop(user_id)
+
+    def invalidate_account(self, uuid: str):
+        """Drops every cached profile that shows this panel account"""
+        self._write_gen += 1
+        self._account_written.set(uuid, self._write_gen)
+        owners = self._owners.pop(uuid)
+        for user_id in owners or ():
+            self._entries.pop(user_id)
+
+profiles = ProfileCache()
@@ -1,9 +1,358 @@
+import asyncio
+import contextvars
+import random
+import re
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+from typing import AsyncIterator
 import aiohttp
 from bot.config import config
+from bot.utils.cache import TTLCache, MISSING
+from bot.utils.ratelimit import TokenBucket, PrioritySemaphore
+from bot.utils import metrics
+from bot.utils.tracing import span, correlation_id, PANEL
+from dateutil import parser
 import structlog
 
 logger = structlog.get_logger()
 
+def parse_dt(value) -> datetime | None:
+    """Panel ISO timestamp -> timezone-aware UTC datetime (naive values are taken as UTC)"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        try:
+            dt = parser.isoparse(value)
+        except (ValueError, TypeError):
+            return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+def unwrap(payload):
+    # Panel responses come as {"response": {...}} or bare
+    if isinstance(payload, dict) and isinstance(payload.get('response'), dict):
+        return payload['response']
+    return payload
+
+class Account:
+    """Normalized panel user. Dates are parsed and the subscription URL resolved once."""
+    __slots__ = ("uuid", "username", "telegram_id", "status", "expire_at",
+                 "traffic_limit_bytes", "traffic_used_bytes", "tag", "subscription_url")
+
+    def __init__(self, uuid: str, username: str = "", telegram_id: int | None = None, status: str | None = None,
+                 expire_at: datetime | None = None, traffic_limit_bytes: int = 0, traffic_used_bytes: int = 0,
+                 tag: str | None = None, subscription_url: str | None = None):
+        self.uuid = uuid
+        self.username = username
+        self.telegram_id = telegram_id
+        self.status = status
+        self.expire_at = expire_at
+        self.traffic_limit_bytes = traffic_limit_bytes
+        self.traffic_used_bytes = traffic_used_bytes
+        self.tag = tag or ""
+        self.subscription_url = subscription_url or f"{config.remnawave_url}/sub/{uuid}"
+
+    @classmethod
+    def from_payload(cls, payload: dict) -> "Account | None":
+        u = unwrap(payload)
+        if not isinstance(u, dict) or not (u.get('uuid') or u.get('id')):
+            return None
+        traffic = u.get('userTraffic') or {}
+        tid = u.get('telegramId')
+        return cls(
+            uuid=u.get('uuid') or u.get('id'),
+            username=u.get('username') or "",
+            telegram_id=int(tid) if tid not in (None, "") else None,
+            status=u.get('status'),
+            expire_at=parse_dt(u.get('expireAt')),
+            traffic_limit_bytes=int(u.get('trafficLimitBytes') or u.get('dataLimit') or 0),
+            traffic_used_bytes=int(traffic.get('usedTrafficBytes') or u.get('usedTrafficBytes') or 0),
+            tag=u.get('tag'),
+            subscription_url=u.get('subscriptionUrl'),
+        )
+
+    def is_active(self, now: datetime | None = None) -> bool:
+        if not self.expire_at:
+            return False
+        return self.expire_at > (now or datetime.now(timezone.utc))
+
+    @property
+    def traffic_percent(self) -> float:
+        if self.traffic_limit_bytes <= 0:
+            return 0
+        return round((self.traffic_used_bytes / self.traffic_limit_bytes) * 100, 1)
+
+class Device:
+    __slots__ = ("hwid", "user_uuid", "platform", "device_model", "updated_at")
+
+    def __init__(self, hwid: str, user_uuid: str, platform: str = "Unknown", device_model: str = "Unknown",
+                 updated_at: datetime | None = None):
+        self.hwid = hwid
+        self.user_uuid = user_uuid
+        self.platform = platform
+        self.device_model = device_model
+        self.updated_at = updated_at
+
+    @classmethod
+    def from_payload(cls, d: dict) -> "Device | None":
+        if not d.get('hwid'):
+            return None
+        return cls(
+            hwid=d['hwid'],
+            user_uuid=d.get('userUuid'),
+            platform=d.get('platform') or "Unknown",
+            device_model=d.get('deviceModel') or "Unknown",
+            updated_at=parse_dt(d.get('updatedAt')),
+        )
+
+class Squad:
+    __slots__ = ("uuid", "name")
+
+    def __init__(self, uuid: str, name: str):
+        self.uuid = uuid
+        self.name = name
+
+    @classmethod
+    def from_payload(cls, s: dict) -> "Squad | None":
+        if not s.get('uuid'):
+            return None
+        return cls(uuid=s['uuid'], name=s.get('slug') or s.get('name') or "Unnamed")
+
+class RemnawaveUnavailable(Exception):
+    """Raised without touching the network while the circuit breaker is open"""
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and fails fast for `reset_timeout` seconds,
+    then lets a single probe through (half-open) to decide whether to close again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.opened_at: float | None = None
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info("remnawave_breaker_closed", trips=self.trips)
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+                logger.error("remnawave_breaker_opened", failures=self.failures, trips=self.trips)
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "trips": self.trips,
+        }
+
+def _error_reason(e: Exception) -> str:
+    if isinstance(e, aiohttp.ClientResponseError):
+        return str(e.status)
+    if isinstance(e, RemnawaveUnavailable):
+        return "circuit_open"
+    if isinstance(e, asyncio.TimeoutError):
+        return "timeout"
+    return type(e).__name__
+
+def _is_transient(e: Exception) -> bool:
+    # Worth retrying and counted against the breaker: network trouble, timeouts, 5xx and 429
+    if isinstance(e, aiohttp.ClientResponseError):
+        return e.status >= 500 or e.status == 429
+    return isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError))
+
+_ID_SEGMENT = re.compile(r"^(?:[0-9a-fA-F-]{16,}|\d+)$")
+
+def endpoint_route(endpoint: str) -> str:
+    """users/3f2a...-... ?size=1 -> users/:id (low-cardinality name for spans and stats)"""
+    path = endpoint.split("?", 1)[0].strip("/")
+    return "/".join(":id" if _ID_SEGMENT.match(part) else part for part in path.split("/"))
+
+# Outbound priority, lower goes first. Set per task via panel_priority().
+PRIORITY_PAYMENT = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY_NAMES = {PRIORITY_PAYMENT: "payment", PRIORITY_DEFAULT: "default", PRIORITY_BACKGROUND: "background"}
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("panel_priority", default=PRIORITY_DEFAULT)
+
+@contextmanager
+def panel_priority(priority: int):
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+class PanelLimiter:
+    """
+    Caps outbound panel traffic: one shared concurrency limit handed out by priority,
+    plus a separate token bucket (requests/second) per priority.
+    """
+
+    def __init__(self):
+        self.slots = PrioritySemaphore(config.remnawave_max_concurrency)
+        rates = {
+            PRIORITY_PAYMENT: config.remnawave_rate_payment,
+            PRIORITY_DEFAULT: config.remnawave_rate_default,
+            PRIORITY_BACKGROUND: config.remnawave_rate_background,
+        }
+        self.buckets = {p: TokenBucket(rate, config.remnawave_rate_burst) for p, rate in rates.items()}
+
+    async def acquire(self) -> int:
+        priority = _priority.get()
+        started = time.monotonic()
+        await self.buckets[priority].acquire()
+        await self.slots.acquire(priority)
+        waited = time.monotonic() - started
+        metrics.panel_queue_wait.observe(waited, priority=PRIORITY_NAMES[priority])
+        if waited > 1.0:
+            logger.warning("remnawave_queue_delay", priority=PRIORITY_NAMES[priority], waited=f"{waited:.3f}s")
+        return priority
+
+    def release(self):
+        self.slots.release()
+
+    def snapshot(self) -> dict[tuple, float]:
+        return {("in_use",): self.slots.in_use, ("queued",): self.slots.queued}
+
+class DeviceIndex:
+    """
+    In-memory map of userUuid -> devices, built from a fully paginated crawl of hwid/devices.
+    The panel ignores user filters on that endpoint, so one crawl serves every user.
+    """
+
+    def __init__(self, api: "RemnawaveAPI"):
+        self.api = api
+        self._by_user: dict[str, list[Device]] = {}
+        self.loaded_at: float | None = None
+        self._task: asyncio.Task | None = None
+        self._background: asyncio.Task | None = None
+
+    @property
+    def is_fresh(self) -> bool:
+        if self.loaded_at is None:
+            return False
+        return time.monotonic() - self.loaded_at < config.remnawave_devices_max_age
+
+    async def refresh(self):
+        # Shares the crawl with any concurrent refresh
+        await self.api._single_flight(("device_index",), self._crawl)
+
+    async def _crawl(self):
+        started = time.monotonic()
+        by_user: dict[str, list[Device]] = {}
+        seen = set()
+        async for raw in self.api.iter_devices():
+            d = Device.from_payload(raw)
+            if not d or (d.user_uuid, d.hwid) in seen:
+                continue
+            seen.add((d.user_uuid, d.hwid))
+            by_user.setdefault(d.user_uuid, []).append(d)
+        total = len(seen)
+        # Swap in one step so readers never see a half-built index
+        self._by_user = by_user
+        self.loaded_at = time.monotonic()
+        logger.debug("device_index_refreshed", devices=total, users=len(by_user), duration=f"{self.loaded_at - started:.3f}s")
+
+    async def get(self, user_uuid: str) -> list[Device]:
+        if self.loaded_at is None:
+            # Nothing to serve yet: this caller has to wait for the first crawl
+            await self.refresh()
+        elif not self.is_fresh:
+            # Stale but usable: answer now, crawl in the background
+            self.refresh_soon()
+        return list(self._by_user.get(user_uuid, []))
+
+    def refresh_soon(self):
+        if self._background is None or self._background.done():
+            self._background = asyncio.create_task(self._background_refresh())
+
+    async def _background_refresh(self):
+        try:
+            with panel_priority(PRIORITY_BACKGROUND):
+                await self.refresh()
+        except Exception as e:
+            logger.error("device_index_refresh_failed", error=str(e))
+
+    def remove(self, user_uuid: str, hwid: str):
+        devices = self._by_user.get(user_uuid)
+        if devices:
+            self._by_user[user_uuid] = [d for d in devices if d.hwid != hwid]
+
+    def add(self, user_uuid: str, payload: dict):
+        device = Device.from_payload({**payload, "userUuid": user_uuid})
+        if not device:
+            return
+        devices = [d for d in self._by_user.get(user_uuid, []) if d.hwid != device.hwid]
+        devices.append(device)
+        self._by_user[user_uuid] = devices
+
+    def drop_user(self, user_uuid: str):
+        self._by_user.pop(user_uuid, None)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        for task in (self._task, self._background):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._background = None
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                with panel_priority(PRIORITY_BACKGROUND):
+                    await self.refresh()
+            except Exception as e:
+                logger.error("device_index_refresh_failed", error=str(e))
+            await asyncio.sleep(config.remnawave_devices_refresh_interval)
+
 class RemnawaveAPI:
     def __init__(self):
         self.base_url = config.remnawave_url.rstrip("/")
@@ -13,38 +362,140 @@ class RemnawaveAPI:
             "Content-Type": "application/json",
             "Accept": "application/json"
         }
+        self._session: aiohttp.ClientSession | None = None
+        # request key -> shared in-flight task (single-flight for identical GETs)
+        self._inflight: dict[tuple, asyncio.Future] = {}
+        # uuid -> user payload, or the 404 exception for negative hits
+        self._user_cache = TTLCache(maxsize=config.remnawave_user_cache_size, ttl=config.remnawave_user_cache_ttl)
+        # uuid -> (payload, Account) so a cached payload is only parsed once
+        self._accounts = TTLCache(maxsize=config.remnawave_user_cache_size, ttl=config.remnawave_user_cache_ttl)
+        # Bumped on every user write so a read that raced a write never repopulates the cache
+        self._user_write_gen = 0
+        self.devices = DeviceIndex(self)
+        self.breaker = CircuitBreaker(config.remnawave_breaker_threshold, config.remnawave_breaker_reset)
+        self.limiter = PanelLimiter()
 
-    async def _request(self, method: str, endpoint: str, data: dict = None):
-        url = f"{self.base_url}/api/{endpoint.lstrip('/')}"
-        async with aiohttp.ClientSession() as session:
+    async def startup(self):
+        """Open the shared pooled session. Called once from bot.main on boot."""
+        if self._session and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=config.remnawave_pool_limit,
+            limit_per_host=config.remnawave_pool_limit_per_host,
+            ttl_dns_cache=config.remnawave_dns_ttl,
+            keepalive_timeout=config.remnawave_keepalive_timeout,
+        )
+        self._session = aiohttp.ClientSession(headers=self.headers, connector=connector)
+        logger.info("remnawave_session_opened", limit=config.remnawave_pool_limit, limit_per_host=config.remnawave_pool_limit_per_host)
+
+    def start_background_tasks(self):
+        self.devices.start()
+
+    async def close(self):
+        await self.devices.stop()
+        if self._session and not self._session.closed:
+            await self._session.close()
+            logger.info("remnawave_session_closed")
+        self._session = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        # Lazy fallback for scripts (debug_*.py) that never call startup()
+        if not self._session or self._session.closed:
+            await self.startup()
+        return self._session
+
+    async def _single_flight(self, key: tuple, factory):
+        """
+        Concurrent callers with the same key share one in-flight call.
+        The shared task is shielded so one cancelled caller does not cancel it for the rest.
+        """
+        fut = self._inflight.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(factory())
+            self._inflight[key] = fut
+
+            def _done(f, key=key):
+                if self._inflight.get(key) is f:
+                    del self._inflight[key]
+                if not f.cancelled():
+                    f.exception() # Mark as retrieved even if every waiter was cancelled
+
+            fut.add_done_callback(_done)
+        return await asyncio.shield(fut)
+
+    async def _request(self, method: str, endpoint: str, data: dict = None, coalesce: bool = True, timeout: float | None = None):
+        if method == "GET" and coalesce:
+            return await self._single_flight(("GET", endpoint), lambda: self._send(method, endpoint, data, timeout))
+        return await self._send(method, endpoint, data, timeout)
+
+    async def _send(self, method: str, endpoint: str, data: dict = None, timeout: float | None = None):
+        # The span and the latency metric cover queueing and retries too: that is what the caller waited for
+        route = endpoint_route(endpoint)
+        started = time.monotonic()
+        with span(f"panel {method} {route}", PANEL, method=method) as s:
             try:
-                async with session.request(method, url, headers=self.headers, json=data) as response:
-                    if not response.ok:
-                        text = await response.text()
-                        if response.status == 404:
-                            logger.debug("remnawave_api_404", method=method, url=url, body=text)
-                        else:
-                            logger.error("remnawave_api_fail", 
-                                         method=method, 
-                                         url=url,
-                                         status=response.status, 
-                                         body=text)
-                    response.raise_for_status()
-                    return await response.json()
+                return await self._send_attempts(method, endpoint, data, timeout, s)
             except Exception as e:
-                if "example.com" in self.base_url:
-                     logger.warning("Using MOCK API response")
-                     return {"uuid": "mock-uuid-1234", "status": "active"}
-                
-                # If it's a 404 error from raise_for_status, we might want to log it as debug or info
-                is_404 = False
-                if hasattr(e, 'status') and e.status == 404: is_404 = True
-                
-                if is_404:
-                    logger.debug("remnawave_api_exception_404", method=method, endpoint=endpoint, error=str(e))
-                else:
-                    logger.error("remnawave_api_exception", method=method, endpoint=endpoint, error=str(e))
-                raise e
+                reason = _error_reason(e)
+                metrics.panel_errors.inc(method=method, route=route, reason=reason)
+                # One line per failed call, after retries; the attempts themselves log at debug
+                log = logger.debug if reason == "404" else logger.error
+                log("remnawave_request_failed", method=method, endpoint=endpoint, status=reason, error=str(e) or type(e).__name__)
+                raise
+            finally:
+                metrics.panel_duration.observe(time.monotonic() - started, method=method, route=route)
+
+    async def _send_attempts(self, method: str, endpoint: str, data: dict, timeout: float | None, s):
+        # Only idempotent reads are retried; a repeated PATCH/POST could double-apply
+        attempts = 1 + (config.remnawave_retries if method == "GET" else 0)
+        for attempt in range(attempts):
+            if s is not None:
+                s.set(attempts=attempt + 1)
+            # Ask the breaker only once a slot is held, so a half-open probe never waits in the queue
+            await self.limiter.acquire()
+            if not self.breaker.allow():
+                self.limiter.release()
+                raise RemnawaveUnavailable(f"Remnawave circuit open, skipping {method} {endpoint}")
+            probe = self.breaker.state == CircuitBreaker.HALF_OPEN
+            try:
+                result = await self._do_request(method, endpoint, data, timeout or config.remnawave_timeout)
+            except Exception as e:
+                if not _is_transient(e):
+                    # The panel answered (4xx): it is healthy, the request was not
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt + 1 >= attempts:
+                    raise
+                error = e
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                self.limiter.release()
+                if probe:
+                    # Cancelled mid-probe: nothing was recorded, let the next call probe instead
+                    self.breaker.release_probe()
+            # Full jitter: sleep uniformly within the exponential window
+            delay = random.uniform(0, min(config.remnawave_backoff_max, config.remnawave_backoff_base * (2 ** attempt)))
+            logger.warning("remnawave_retry", method=method, endpoint=endpoint, attempt=attempt + 1, delay=f"{delay:.2f}s", error=str(error) or type(error).__name__)
+            await asyncio.sleep(delay)
+
+    async def _do_request(self, method: str, endpoint: str, data: dict = None, timeout: float = None):
+        url = f"{self.base_url}/api/{endpoint.lstrip('/')}"
+        session = await self._get_session()
+        cid = correlation_id()
+        headers = {"X-Correlation-Id": cid} if cid else None
+        try:
+            async with session.request(method, url, json=data, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                if not response.ok:
+                    # Per attempt; _send logs the call's final failure once
+                    logger.debug("remnawave_api_fail", method=method, url=url, status=response.status, body=await response.text())
+                response.raise_for_status()
+                return await response.json()
+        except Exception as e:
+            logger.debug("remnawave_api_exception", method=method, endpoint=endpoint, error=str(e) or type(e).__name__)
+            raise e
 
     async def create_user(self, telegram_id: int, username: str):
         # Guessing endpoint structure based on common panels
@@ -74,20 +525,77 @@ class RemnawaveAPI:
         }
         return await self._request("POST", "users", data)
 
-    async def get_user(self, uuid: str):
-        return await self._request("GET", f"users/{uuid}")
+    async def get_user(self, uuid: str, fresh: bool = False):
+        # fresh=True skips the cache, for read-modify-write paths (traffic/expiry increments)
+        cached = MISSING if fresh else self._user_cache.get(uuid)
+        if cached is not MISSING:
+            if isinstance(cached, Exception):
+                raise cached
+            return cached
+
+        gen = self._user_write_gen
+        try:
+            # A fresh read must not piggyback on a GET that started before the caller's write
+            user = await self._request("GET", f"users/{uuid}", coalesce=not fresh)
+        except aiohttp.ClientResponseError as e:
+            if e.status == 404 and gen == self._user_write_gen:
+                self._user_cache.set(uuid, e, ttl=config.remnawave_user_negative_ttl)
+            raise
+        if gen == self._user_write_gen:
+            self._user_cache.set(uuid, user)
+        return user
+
+    async def get_account(self, uuid: str, fresh: bool = False) -> Account | None:
+        payload = await self.get_user(uuid, fresh=fresh)
+        hit = self._accounts.get(uuid)
+        if hit is not MISSING and hit[0] is payload:
+            return hit[1]
+        account = Account.from_payload(payload)
+        self._accounts.set(uuid, (payload, account))
+        return account
+
+    def invalidate_user(self, uuid: str):
+        self._user_write_gen += 1
+        self._user_cache.pop(uuid)
+
+    def apply_user_snapshot(self, data: dict):
+        """Pushes a user record received out of band (panel webhook) into the cache"""
+        if data.get('uuid'):
+            self._remember_user(data['uuid'], {"response": data})
+
+    def cached_updated_at(self, uuid: str) -> datetime | None:
+        cached = self._user_cache.get(uuid)
+        if cached is MISSING:
+            return None
+        data = unwrap(cached)
+        return parse_dt(data.get('updatedAt')) if isinstance(data, dict) else None
+
+    def _remember_user(self, uuid: str, resp):
+        # PATCH returns the full updated user; reuse it instead of a refetch
+        data = resp.get('response', resp) if isinstance(resp, dict) else None
+        if isinstance(data, dict) and data.get('uuid') == uuid:
+            self._user_write_gen += 1
+            self._user_cache.set(uuid, resp)
+        else:
+            self.invalidate_user(uuid)
 
     async def update_user(self, uuid: str, data: dict):
         payload = data.copy()
         payload['uuid'] = uuid
         # Per docs: PATCH /api/users
-        return await self._request("PATCH", "users", payload)
+        try:
+            resp = await self._request("PATCH", "users", payload)
+        except Exception:
+            self.invalidate_user(uuid)
+            raise
+        self._remember_user(uuid, resp)
+        return resp
 
     async def add_duration(self, uuid: str, days: int):
         from datetime import datetime, timedelta
         import dateutil.parser
 
-        user = await self.get_user(uuid)
+        user = await self.get_user(uuid, fresh=True)
         current_expire = user.get('expireAt')
         
         if current_expire:
@@ -114,6 +622,12 @@ class RemnawaveAPI:
         return await self.update_user(uuid, {"expireAt": new_expire.isoformat().replace("+00:00", "Z")})
 
     async def get_users(self, search: str = None, limit: int = 100, offset: int = 0):
+        return await self._single_flight(
+            ("get_users", search, limit, offset),
+            lambda: self._fetch_users(search, limit, offset)
+        )
+
+    async def _fetch_users(self, search: str = None, limit: int = 100, offset: int = 0):
         params = {
             "limit": limit,
             "offset": offset,
@@ -122,15 +636,92 @@ class RemnawaveAPI:
         }
         if search:
             params['search'] = search
-        
-        url = f"{self.base_url}/api/users"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=self.headers, params=params) as response:
-                if not response.ok:
-                    text = await response.text()
-                    logger.error("remnawave_get_users_fail", status=response.status, body=text)
-                    return []
-                return await response.json()
+
+        try:
+            # Already single-flighted by get_users
+            return await self._request("GET", f"users?{urlencode(params)}", coalesce=False)
+        except aiohttp.ClientResponseError as e:
+            # Outages (5xx/429) propagate: an empty list would read as "this user has no accounts"
+            if _is_transient(e):
+                raise
+            logger.error("remnawave_get_users_fail", status=e.status, body=e.message)
+            return []
+
+    async def _iter_pages(self, endpoint: str, items_key: str, page_size: int, strict: bool = False,
+                          listing: dict | None = None) -> AsyncIterator[list]:
+        """
+        Walks a start/size paginated listing page by page.
+        Up to `remnawave_page_prefetch` pages are requested ahead of the consumer, never more,
+        so memory stays bounded by (prefetch + 1) pages regardless of panel size.
+        strict=True raises instead of stopping early when the panel ignores the offset,
+        for callers that must know the listing was complete.
+        If given, `listing["total"]` receives the item count the panel reported.
+        """
+        # At least the next page is always requested before yielding the current one
+        prefetch = max(config.remnawave_page_prefetch, 1)
+        sep = "&" if "?" in endpoint else "?"
+
+        def fetch(start: int) -> asyncio.Future:
+            return asyncio.ensure_future(self._request(
+                "GET", f"{endpoint}{sep}start={start}&size={page_size}", timeout=config.remnawave_list_timeout
+            ))
+
+        pending = deque([fetch(0)])
+        next_start = page_size
+        total = None
+        prev_first = None
+        try:
+            while pending:
+                resp = await pending.popleft()
+                data = resp.get('response', {}) if isinstance(resp, dict) else {}
+                page = data.get(items_key, []) if isinstance(data, dict) else []
+                if total is None and isinstance(data, dict) and data.get('total') is not None:
+                    total = int(data['total'])
+                    if listing is not None:
+                        listing["total"] = total
+
+                if page and page[0] == prev_first:
+                    # Panel ignored the offset and served the same page again
+                    logger.warning("remnawave_paging_stalled", endpoint=endpoint, start=next_start)
+                    if strict:
+                        raise RuntimeError(f"Paging stalled on {endpoint}")
+                    return
+                prev_first = page[0] if page else None
+
+                if len(page) < page_size:
+                    # Last page: anything prefetched past it is empty
+                    for f in pending:
+                        f.cancel()
+                    pending.clear()
+                else:
+                    while len(pending) < prefetch and (total is None or next_start < total):
+                        pending.append(fetch(next_start))
+                        next_start += page_size
+                        if total is None:
+                            break # Without a total, only look one page ahead
+
+                if page:
+                    yield page
+        finally:
+            for f in pending:
+                f.cancel()
+
+    async def iter_users(self, page_size: int | None = None, strict: bool = False) -> AsyncIterator[dict]:
+        """Yields every panel user, one record at a time."""
+        async for page in self.iter_user_pages(page_size, strict=strict):
+            for u in page:
+                yield u
+
+    async def iter_user_pages(self, page_size: int | None = None, strict: bool = False, listing: dict | None = None) -> AsyncIterator[list]:
+        """Yields every panel user, one page at a time (see _iter_pages for `listing`)."""
+        async for page in self._iter_pages("users", "users", page_size or config.remnawave_users_page_size, strict=strict, listing=listing):
+            yield page
+
+    async def iter_devices(self, page_size: int | None = None) -> AsyncIterator[dict]:
+        """Yields every HWID device across all users, one record at a time."""
+        async for page in self._iter_pages("hwid/devices", "devices", page_size or config.remnawave_devices_page_size):
+            for d in page:
+                yield d
 
     async def get_squads(self):
         return await self._request("GET", "internal-squads")
@@ -139,13 +730,13 @@ class RemnawaveAPI:
         return await self._request("GET", f"internal-squads/{uuid}")
 
     async def add_traffic(self, uuid: str, gigabytes: int):
-        user = await self.get_user(uuid)
-        current_limit = user.get('dataLimit', 0) or 0
+        user = unwrap(await self.get_user(uuid, fresh=True))
+        current_limit = user.get('trafficLimitBytes') or 0
         
         bytes_to_add = int(gigabytes * 1024 * 1024 * 1024)
         new_limit = int(current_limit) + bytes_to_add
         
-        return await self.update_user(uuid, {"dataLimit": new_limit, "trafficLimitStrategy": "NO_RESET"})
+        return await self.update_user(uuid, {"trafficLimitBytes": new_limit, "trafficLimitStrategy": "NO_RESET"})
 
     async def add_user_to_squad(self, user_uuid: str, squad_uuid: str):
         # Using PATCH /api/users to update activeInternalSquads as per user suggestion
@@ -155,22 +746,28 @@ class RemnawaveAPI:
             "activeInternalSquads": [squad_uuid]
         })
 
-    async def get_user_devices(self, user_uuid: str):
-        # API seems to ignore userId filter and returns global list.
-        # We must filter manually.
-        # API uses 'size' param, not 'limit'. default 25.
-        response = await self._request("GET", "hwid/devices?size=1000") 
-        if response and 'response' in response:
-             all_devices = response['response'].get('devices', [])
-             # Filter strictly by UUID
-             return [d for d in all_devices if d.get('userUuid') == user_uuid]
-        return []
+    async def get_user_devices(self, user_uuid: str) -> list[Device]:
+        # API ignores userId filter and returns a global list,
+        # so lookups are served from the paginated device index.
+        return await self.devices.get(user_uuid)
 
     async def delete_user_device(self, hwid: str, user_uuid: str):
         # API requires userUuid for deletion validation
-        return await self._request("POST", "hwid/devices/delete", {
-            "hwid": hwid,
-            "userUuid": user_uuid
-        })
+        try:
+            resp = await self._request("POST", "hwid/devices/delete", {
+                "hwid": hwid,
+                "userUuid": user_uuid
+            })
+        finally:
+            self.invalidate_user(user_uuid)
+        self.devices.remove(user_uuid, hwid)
+        return resp
 
 api = RemnawaveAPI()
+
+metrics.panel_slots.set_function(api.limiter.snapshot)
+metrics.panel_breaker_state.set_function(lambda: {
+    (state,): int(api.breaker.state == state) for state in (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN)
+})
+metrics.panel_breaker_failures.set_function(lambda: {(): api.breaker.snapshot()["consecutive_failures"]})
+metrics.panel_breaker_trips.set_function(lambda: {(): api.breaker.snapshot()["trips"]})
@@ -0,0 +1,74 @@
+import asyncio
+from bot.config import config
+from bot.services.remnawave import api, panel_priority, PRIORITY_BACKGROUND, Squad
+import structlog
+
+logger = structlog.get_logger()
+
+class SquadCatalog:
+    """
+    In-memory copy of the panel's internal squads, loaded at startup and refreshed in the background.
+    Admin screens read names from here instead of calling get_squad per render.
+    """
+
+    def __init__(self):
+        self._squads: dict[str, Squad] = {}
+        self.loaded = False
+        self._task: asyncio.Task | None = None
+
+    async def refresh(self):
+        resp = await api.get_squads()
+        data = resp.get('response', resp) if isinstance(resp, dict) else resp
+        # Handle list or {internalSquads: [...]} / {squads: [...]} wrappers
+        items = data
+        if isinstance(data, dict):
+            items = data.get('internalSquads') or data.get('squads') or data.get('items') or []
+        squads = (Squad.from_payload(s) for s in items or [] if isinstance(s, dict))
+        self._squads = {s.uuid: s for s in squads if s}
+        self.loaded = True
+        logger.debug("squad_catalog_refreshed", squads=len(self._squads))
+
+    def name(self, uuid: str) -> str | None:
+        s = self._squads.get(uuid)
+        return s.name if s else None
+
+    def display(self, uuid: str) -> str:
+        name = self.name(uuid)
+        return f"{name} ({uuid})" if name else uuid
+
+    def is_known(self, uuid: str) -> bool:
+        """True if the squad exists, or if the catalog is not loaded and we cannot tell"""
+        return not self.loaded or uuid in self._squads
+
+    def all(self) -> list[Squad]:
+        return sorted(self._squads.values(), key=lambda s: s.name.lower())
+
+    async def start(self):
+        # First load inline so admin screens have names right after boot
+        try:
+            with panel_priority(PRIORITY_BACKGROUND):
+                await self.refresh()
+        except Exception as e:
+            logger.error("squad_catalog_load_failed", error=str(e))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(config.remnawave_squads_refresh_interval)
+            try:
+                with panel_priority(PRIORITY_BACKGROUND):
+                    await self.refresh()
+            except Exception as e:
+                logger.error("squad_catalog_refresh_failed", error=str(e))
+
+catalog = SquadCatalog()
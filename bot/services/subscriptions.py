@@ -0,0 +1,35 @@
+"""
+Denormalized subscription snapshot on users (current tariff, expiry, traffic, link).
+fulfill_order writes it directly; everything else arrives through the account mirror,
+whose background sync copies changed rows over (AccountMirror.push_snapshots).
+"""
+from datetime import datetime, timezone
+from bot.database import models
+from bot.services.remnawave import Account
+from bot.services.accounts import mirror
+
+def apply_snapshot(user: models.User, account: Account):
+    """Copies a panel account onto the user row (caller commits)"""
+    user.sub_expire_at = account.expire_at.astimezone(timezone.utc).replace(tzinfo=None) if account.expire_at else None
+    user.sub_traffic_limit_bytes = account.traffic_limit_bytes
+    user.sub_traffic_used_bytes = account.traffic_used_bytes
+    user.sub_url = account.subscription_url
+    user.sub_synced_at = datetime.utcnow()
+
+def snapshot_account(user: models.User) -> Account | None:
+    """
+    The user's panel account as of the last snapshot, or None when there is no
+    trustworthy snapshot and the caller should ask the panel instead.
+    """
+    if not user.remnawave_uuid or user.sub_synced_at is None:
+        return None
+    if not mirror.ready:
+        # Nothing keeps the snapshot current until the mirror has synced once
+        return None
+    return Account(
+        uuid=user.remnawave_uuid,
+        expire_at=user.sub_expire_at.replace(tzinfo=timezone.utc) if user.sub_expire_at else None,
+        traffic_limit_bytes=user.sub_traffic_limit_bytes or 0,
+        traffic_used_bytes=user.sub_traffic_used_bytes or 0,
+        subscription_url=user.sub_url,
+    )
@@ -0,0 +1,198 @@
+"""
+Numeric telemetry in the Prometheus text exposition format (served at /metrics).
+Counters, gauges and histograms live in one process-wide registry; gauges can also be
+computed at scrape time from a callback, so nothing is polled in between.
+"""
+import abc
+import asyncio
+import math
+import time
+from typing import Callable
+from bot.config import config
+
+_registry: list["_Metric"] = []
+
+# Seconds; covers a fast cache hit up to a panel call that ran into its timeout
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric(abc.ABC):
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labels
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    @abc.abstractmethod
+    def samples(self) -> list[str]:
+        """Exposition lines for this metric, without the HELP/TYPE header"""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+class _Simple(_Metric):
+    """One value per label set, kept here or computed at scrape time from a callback"""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: dict[tuple, float] = {}
+        self._function: Callable[[], dict[tuple, float]] | None = None
+
+    def set_function(self, function: Callable[[], dict[tuple, float]]):
+        """Computes the label tuple -> value map at scrape time instead"""
+        self._function = function
+
+    def samples(self) -> list[str]:
+        values = self._values
+        if self._function is not None:
+            try:
+                values = self._function()
+            except Exception:
+                values = {}
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in values.items()]
+
+class Counter(_Simple):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Simple):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets) + (math.inf,)
+        # labels -> [per-bucket counts..., sum, count]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[i] += 1
+                break
+        state[-2] += value
+        state[-1] += 1
+
+    def samples(self) -> list[str]:
+        lines = []
+        for key, state in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{labels} {state[-1]}")
+        return lines
+
+def render() -> str:
+    return "\n".join(m.render() for m in _registry) + "\n"
+
+# --- Bot metrics ---
+
+update_duration = Histogram("bot_update_duration_seconds", "Time to process one Telegram update", ("handler",))
+update_errors = Counter("bot_update_errors_total", "Updates whose handler raised", ("handler",))
+
+panel_duration = Histogram("bot_panel_request_duration_seconds", "Remnawave API calls, including queueing and retries", ("method", "route"))
+panel_errors = Counter("bot_panel_request_errors_total", "Remnawave API calls that failed", ("method", "route", "reason"))
+panel_queue_wait = Histogram("bot_panel_queue_wait_seconds", "Time a panel call waited for its rate limit and a concurrency slot", ("priority",),
+                             buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+panel_breaker_state = Gauge("bot_panel_breaker_state", "1 for the panel circuit breaker's current state", ("state",))
+panel_breaker_failures = Gauge("bot_panel_breaker_consecutive_failures", "Transient panel failures since the last success")
+panel_breaker_trips = Counter("bot_panel_breaker_trips_total", "Times the panel circuit breaker opened")
+panel_slots = Gauge("bot_panel_slots", "Panel concurrency slots in use and calls queued for one", ("state",))
+
+db_checkout_wait = Histogram("bot_db_pool_checkout_wait_seconds", "Time spent waiting for a pooled DB connection",
+                             buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0, 30.0))
+db_pool = Gauge("bot_db_pool_connections", "DB pool connections by state", ("state",))
+db_handler_checkouts = Counter("bot_db_handler_checkouts_total", "Pooled DB connections checked out by each handler", ("handler",))
+db_handler_held = Histogram("bot_db_handler_connection_held_seconds", "Time one update held pooled DB connections, for updates that used the DB", ("handler",),
+                            buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 30.0))
+
+fulfillments = Counter("bot_payment_fulfillments_total", "Order fulfillment outcomes", ("outcome",))
+fulfillment_duration = Histogram("bot_payment_fulfillment_duration_seconds", "Time to fulfill a paid order")
+
+fsm_states = Gauge("bot_fsm_states", "Users currently in each FSM state", ("state",))
+
+loop_lag = Histogram("bot_event_loop_lag_seconds", "How late the event loop ran a timer",
+                     buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+loop_lag_last = Gauge("bot_event_loop_lag_last_seconds", "Most recent event loop lag sample")
+
+traced_updates = Counter("bot_traced_updates_total", "Sampled (traced) updates by handler", ("handler",))
+trace_span_seconds = Counter("bot_trace_span_seconds_total", "Time traced updates spent in child spans, by handler and span kind", ("handler", "kind"))
+trace_span_calls = Counter("bot_trace_span_calls_total", "Child spans in traced updates, by handler and span kind", ("handler", "kind"))
+trace_dropped = Counter("bot_trace_dropped_total", "Finished traces dropped because the export queue was full")
+
+log_dropped = Counter("bot_log_records_dropped_total", "Log records dropped because the logging queue was full")
+
+def count_fsm_states(storage) -> dict[tuple, float]:
+    """State -> user count for aiogram's MemoryStorage (other storages are not scanned)"""
+    counts: dict[tuple, float] = {}
+    for record in list(getattr(storage, "storage", {}).values()):
+        state = getattr(record, "state", None)
+        if state:
+            counts[(state,)] = counts.get((state,), 0) + 1
+    return counts
+
+class LoopLagMonitor:
+    """Sleeps for a fixed interval and records how much later than asked it woke up"""
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        interval = config.metrics_loop_lag_interval
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag = max(0.0, time.perf_counter() - started - interval)
+            loop_lag.observe(lag)
+            loop_lag_last.set(lag)
+
+loop_monitor = LoopLagMonitor()
@@ -0,0 +1,80 @@
+"""
+On-demand sampling CPU profiler for the running bot.
+While a capture runs, a helper thread snapshots the event loop thread's Python stack every
+profile_sample_interval seconds and counts identical stacks. Output is the collapsed-stack
+format ("outer;inner;leaf count" per line) read by flamegraph.pl, speedscope and friends.
+Time the loop spends waiting shows up as selectors frames. Nothing runs between captures.
+"""
+import asyncio
+import os
+import sys
+import threading
+from collections import Counter
+from types import CodeType
+
+class ProfilerBusy(Exception):
+    """Raised when a capture is requested while another one is running"""
+
+def _label(code: CodeType, cache: dict) -> str:
+    label = cache.get(code)
+    if label is None:
+        path = code.co_filename
+        # Keep the part worth reading: bot/handlers/user.py, aiogram/dispatcher/router.py, asyncio/events.py
+        if "site-packages" + os.sep in path:
+            path = path.split("site-packages" + os.sep, 1)[1]
+        elif path.startswith(os.getcwd() + os.sep):
+            path = path[len(os.getcwd()) + 1:]
+        elif path.startswith(sys.prefix) or path.startswith(sys.base_prefix):
+            path = os.path.basename(os.path.dirname(path)) + "/" + os.path.basename(path)
+        label = cache[code] = f"{code.co_name} ({path}:{code.co_firstlineno})".replace(";", ":")
+    return label
+
+class SamplingProfiler:
+    def __init__(self):
+        self.running = False
+
+    async def capture(self, seconds: float, interval: float) -> tuple[Counter, int]:
+        """Samples the calling event loop's thread for `seconds`; returns (stack counts, samples)"""
+        if self.running:
+            raise ProfilerBusy()
+        self.running = True
+        target = threading.get_ident()
+        stop = threading.Event()
+        stacks: Counter = Counter()
+        labels: dict = {}
+        samples = 0
+
+        def sample():
+            nonlocal samples
+            while not stop.wait(interval):
+                frame = sys._current_frames().get(target)
+                stack = []
+                while frame is not None:
+                    stack.append(_label(frame.f_code, labels))
+                    frame = frame.f_back
+                if stack:
+                    stack.reverse()
+                    stacks[";".join(stack)] += 1
+                    samples += 1
+
+        thread = threading.Thread(target=sample, name="cpu-profiler", daemon=True)
+        thread.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            stop.set()
+            await asyncio.to_thread(thread.join)
+            self.running = False
+        return stacks, samples
+
+def collapsed(stacks: Counter) -> bytes:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common()).encode()
+
+def top_frames(stacks: Counter, limit: int = 5) -> list[tuple[str, int]]:
+    """Leaf frames with the most samples (self time)"""
+    leaves: Counter = Counter()
+    for stack, count in stacks.items():
+        leaves[stack.rsplit(";", 1)[-1]] += count
+    return leaves.most_common(limit)
+
+profiler = SamplingProfiler()
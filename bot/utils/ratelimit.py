@@ -0,0 +1,75 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+class TokenBucket:
+    """
+    Classic token bucket. rate <= 0 means unlimited.
+    Waiters are served in arrival order.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class PrioritySemaphore:
+    """
+    Semaphore that hands freed slots to the waiter with the lowest priority number first
+    (FIFO within one priority).
+    """
+
+    def __init__(self, value: int):
+        self._value = value
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self.in_use = 0
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, f in self._waiters if not f.done())
+
+    async def acquire(self, priority: int = 0):
+        if self._value > 0 and not self.queued:
+            self._value -= 1
+            self.in_use += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Slot was handed over just as we got cancelled: pass it on
+                self.in_use += 1
+                self.release()
+            raise
+        self.in_use += 1
+
+    def release(self):
+        self.in_use -= 1
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self._value += 1
@@ -0,0 +1,278 @@
+"""
+Per-update tracing.
+TracingMiddleware opens a root span per update; SQL statements, panel calls, Fluent formats and
+Telegram sends open child spans under whatever span is current in the task's context.
+Finished traces are summarized per handler (tracer.summary, exported on /metrics) and, if trace_exporter is set,
+batched to a JSON-lines file or an OTLP/HTTP collector in the OTLP JSON encoding.
+"""
+import asyncio
+import contextvars
+import json
+import secrets
+import time
+from contextlib import contextmanager
+from pathlib import Path
+import aiohttp
+from bot.config import config
+from bot.logging_setup import sampled
+from bot.utils import metrics
+import structlog
+
+logger = structlog.get_logger()
+
+# Span kinds; everything but HANDLER counts towards the per-update breakdown
+HANDLER = "handler"
+DB = "db"
+PANEL = "panel"
+I18N = "i18n"
+TELEGRAM = "telegram"
+BREAKDOWN_KINDS = (DB, PANEL, I18N, TELEGRAM)
+
+# OTLP SpanKind: internal for the handler/Fluent, client for everything that leaves the process
+_OTLP_KIND = {HANDLER: 1, I18N: 1, DB: 3, PANEL: 3, TELEGRAM: 3}
+
+class Trace:
+    __slots__ = ("trace_id", "spans", "closed")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: list[Span] = []
+        self.closed = False
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "attributes", "start_ns", "end_ns", "error")
+
+    def __init__(self, trace: Trace, parent_id: str | None, name: str, kind: str, attributes: dict):
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.error: str | None = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self):
+        self.end_ns = time.time_ns()
+        if not self.trace.closed:
+            self.trace.spans.append(self)
+
+_current_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar("current_span", default=None)
+_correlation_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("correlation_id", default=None)
+
+def correlation_id() -> str | None:
+    """Id of the update being handled; sent to the panel as X-Correlation-Id"""
+    return _correlation_id.get()
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+def start_span(name: str, kind: str, **attributes) -> Span | None:
+    """
+    Child span of the current one, without making it current (for leaf work timed from
+    callbacks, like SQL cursor events). None when the update is not traced.
+    """
+    parent = _current_span.get()
+    if parent is None or parent.trace.closed:
+        return None
+    return Span(parent.trace, parent.span_id, name, kind, attributes)
+
+@contextmanager
+def span(name: str, kind: str, **attributes):
+    s = start_span(name, kind, **attributes)
+    if s is None:
+        yield None
+        return
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        s.finish()
+
+@contextmanager
+def trace_update(name: str, **attributes):
+    """Root span of one update. The correlation id is set even when the trace is sampled out."""
+    trace_id = secrets.token_hex(16)
+    cid_token = _correlation_id.set(trace_id)
+    if not sampled(config.trace_sample_rate):
+        try:
+            yield None
+        finally:
+            _correlation_id.reset(cid_token)
+        return
+
+    trace = Trace(trace_id)
+    root = Span(trace, None, name, HANDLER, attributes)
+    token = _current_span.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        root.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        _correlation_id.reset(cid_token)
+        root.finish()
+        trace.closed = True
+        tracer.finish(trace)
+
+def breakdown(root: Span | None = None) -> dict[str, float]:
+    """Seconds spent per span kind so far in the current (or given) update"""
+    root = root or _current_span.get()
+    totals = dict.fromkeys(BREAKDOWN_KINDS, 0.0)
+    if root is None:
+        return totals
+    for s in root.trace.spans:
+        if s.kind in totals:
+            totals[s.kind] += s.duration
+    return totals
+
+class Tracer:
+    """Collects finished traces: per-handler summary plus the export queue"""
+
+    def __init__(self):
+        # handler name -> {"count", "total", "max", "errors", "<kind>", "<kind>_calls"}
+        self.summary: dict[str, dict] = {}
+        self.dropped = 0
+        self._pending: list[Trace] = []
+        self._task: asyncio.Task | None = None
+        self._http: aiohttp.ClientSession | None = None
+
+    def summary_metrics(self) -> dict[str, dict[tuple, float]]:
+        """tracer.summary reshaped into label tuple -> value maps for /metrics"""
+        out = {"updates": {}, "seconds": {}, "calls": {}}
+        for handler, st in list(self.summary.items()):
+            out["updates"][(handler,)] = st["count"]
+            for kind in BREAKDOWN_KINDS:
+                out["seconds"][(handler, kind)] = st[kind]
+                out["calls"][(handler, kind)] = st[f"{kind}_calls"]
+        return out
+
+    def finish(self, trace: Trace):
+        root = trace.spans[-1]
+        st = self.summary.get(root.name)
+        if st is None:
+            st = self.summary[root.name] = {"count": 0, "total": 0.0, "max": 0.0, "errors": 0}
+            for kind in BREAKDOWN_KINDS:
+                st[kind] = 0.0
+                st[f"{kind}_calls"] = 0
+        st["count"] += 1
+        st["total"] += root.duration
+        st["max"] = max(st["max"], root.duration)
+        if root.error:
+            st["errors"] += 1
+        for s in trace.spans:
+            if s.kind in BREAKDOWN_KINDS:
+                st[s.kind] += s.duration
+                st[f"{s.kind}_calls"] += 1
+
+        if config.trace_exporter == "none":
+            return
+        if len(self._pending) >= config.trace_queue_size:
+            self.dropped += 1
+            return
+        self._pending.append(trace)
+
+    async def start(self):
+        if config.trace_exporter == "none":
+            return
+        if config.trace_exporter == "file":
+            Path(config.trace_file).parent.mkdir(parents=True, exist_ok=True)
+        self._task = asyncio.create_task(self._loop())
+        logger.info("tracing_started", exporter=config.trace_exporter)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._http:
+            await self._http.close()
+            self._http = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(config.trace_export_interval)
+            await self.flush()
+
+    async def flush(self):
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        payload = self._encode(batch)
+        try:
+            if config.trace_exporter == "file":
+                await asyncio.to_thread(self._append, json.dumps(payload, separators=(",", ":")))
+            elif config.trace_exporter == "otlp":
+                if self._http is None or self._http.closed:
+                    self._http = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+                async with self._http.post(config.trace_otlp_endpoint, json=payload) as response:
+                    if not response.ok:
+                        logger.warning("trace_export_fail", status=response.status, traces=len(batch))
+        except Exception as e:
+            logger.warning("trace_export_exception", error=str(e), traces=len(batch))
+
+    @staticmethod
+    def _append(line: str):
+        with open(config.trace_file, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    @staticmethod
+    def _encode(batch: list[Trace]) -> dict:
+        """OTLP ExportTraceServiceRequest, JSON encoding"""
+        spans = []
+        for trace in batch:
+            for s in trace.spans:
+                item = {
+                    "traceId": trace.trace_id,
+                    "spanId": s.span_id,
+                    "name": s.name,
+                    "kind": _OTLP_KIND.get(s.kind, 1),
+                    "startTimeUnixNano": str(s.start_ns),
+                    "endTimeUnixNano": str(s.end_ns),
+                    "attributes": [_attribute("span.kind", s.kind)] + [_attribute(k, v) for k, v in s.attributes.items() if v is not None],
+                    "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+                }
+                if s.parent_id:
+                    item["parentSpanId"] = s.parent_id
+                spans.append(item)
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_attribute("service.name", config.trace_service_name)]},
+                "scopeSpans": [{"scope": {"name": "bot"}, "spans": spans}],
+            }]
+        }
+
+def _attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        encoded = {"boolValue": value}
+    elif isinstance(value, int):
+        encoded = {"intValue": str(value)}
+    elif isinstance(value, float):
+        encoded = {"doubleValue": value}
+    else:
+        encoded = {"stringValue": str(value)}
+    return {"key": key, "value": encoded}
+
+tracer = Tracer()
+
+metrics.traced_updates.set_function(lambda: tracer.summary_metrics()["updates"])
+metrics.trace_span_seconds.set_function(lambda: tracer.summary_metrics()["seconds"])
+metrics.trace_span_calls.set_function(lambda: tracer.summary_metrics()["calls"])
+metrics.trace_dropped.set_function(lambda: {(): tracer.dropped})
@@ -0,0 +1,22 @@
+from aiohttp import web
+from bot.config import config
+from bot.services.diagnostics import start_cpu_profile
+from bot.webhooks.metrics import authorized
+import structlog
+
+logger = structlog.get_logger()
+
+async def handle_profile_cpu(request: web.Request):
+    """POST ?seconds=N: record a CPU profile; the collapsed stacks go to the admin group"""
+    # Only registered when PROFILE_TOKEN is set, but never answer without it
+    if not config.profile_token or not authorized(request, config.profile_token):
+        return web.Response(status=401)
+    try:
+        seconds = float(request.query.get("seconds", "30"))
+    except ValueError:
+        return web.json_response({"error": "seconds must be a number"}, status=400)
+    if not 1 <= seconds <= config.profile_max_seconds:
+        return web.json_response({"error": f"seconds must be between 1 and {config.profile_max_seconds}"}, status=400)
+    if not start_cpu_profile(request.app["bot"], seconds, requested_by=f"http {request.remote}"):
+        return web.json_response({"error": "a profile is already being recorded"}, status=409)
+    return web.json_response({"status": "started", "seconds": seconds}, status=202)
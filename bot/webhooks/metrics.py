@@ -0,0 +1,34 @@
+import hmac
+from aiohttp import web
+from bot.config import config
+from bot.utils import metrics
+import structlog
+
+logger = structlog.get_logger()
+
+def authorized(request: web.Request, token) -> bool:
+    """Bearer check for operator routes; open when no token is configured"""
+    if not token:
+        return True
+    header = request.headers.get("Authorization", "")
+    return hmac.compare_digest(header.encode(), f"Bearer {token.get_secret_value()}".encode())
+
+async def handle_metrics(request: web.Request):
+    if not authorized(request, config.metrics_token):
+        return web.Response(status=401)
+    return web.Response(body=metrics.render().encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+async def start_metrics_server(bot=None) -> web.AppRunner:
+    """Polling mode has no web app of its own: serve /metrics (and the profiling trigger) from a small side server"""
+    app = web.Application()
+    app.router.add_get(config.metrics_path, handle_metrics)
+    if bot is not None and config.profile_token:
+        from bot.webhooks.diagnostics import handle_profile_cpu
+        app["bot"] = bot
+        app.router.add_post(config.profile_path, handle_profile_cpu)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host=config.metrics_host, port=config.metrics_port)
+    await site.start()
+    logger.info("Metrics server running", host=config.metrics_host, port=config.metrics_port, path=config.metrics_path)
+    return runner
@@ -0,0 +1,114 @@
+import hashlib
+import hmac
+import json
+import time
+from aiohttp import web
+from bot.config import config
+from bot.services.remnawave import api, parse_dt
+from bot.services.accounts import mirror
+from bot.services.profiles import profiles
+import structlog
+
+logger = structlog.get_logger()
+
+# Panel signs the raw body with HMAC-SHA256 (hex) using the shared webhook secret.
+# The delivery time is the body's "timestamp" field, so it is covered by the signature.
+SIGNATURE_HEADER = "X-Remnawave-Signature"
+
+def sign(body: bytes, secret: str) -> str:
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+def _epoch(timestamp) -> float | None:
+    if isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+        ts = float(timestamp)
+    elif isinstance(timestamp, str) and timestamp:
+        try:
+            ts = float(timestamp)
+        except ValueError:
+            dt = parse_dt(timestamp)
+            return dt.timestamp() if dt else None
+    else:
+        return None
+    return ts / 1000 if ts > 1e12 else ts # milliseconds
+
+def verify(body: bytes, signature: str | None) -> dict | None:
+    """The decoded delivery if it is signed and recent, else None"""
+    secret = config.remnawave_webhook_secret
+    if not secret or not signature:
+        return None
+    # Bytes: compare_digest raises TypeError on non-ASCII str, which would surface as a 500
+    if not hmac.compare_digest(sign(body, secret.get_secret_value()).encode(), signature.encode()):
+        return None
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return None
+    if not isinstance(payload, dict):
+        return None
+    # Mandatory: without it a captured delivery could be replayed forever
+    ts = _epoch(payload.get('timestamp'))
+    if ts is None or abs(time.time() - ts) > config.remnawave_webhook_tolerance:
+        return None
+    return payload
+
+async def _is_stale(user: dict) -> bool:
+    """True if the cache or the mirror already holds a newer version of this user"""
+    incoming = parse_dt(user.get('updatedAt'))
+    if incoming is None:
+        return False
+    for known in (api.cached_updated_at(user['uuid']), await mirror.updated_at(user['uuid'])):
+        if known is not None and known > incoming:
+            return True
+    return False
+
+async def apply_panel_event(event: str, data: dict):
+    """Pushes one panel event into every local cache, mirror and index the bot keeps"""
+    if event.startswith("user_hwid_devices."):
+        user = data.get('user') or {}
+        device = data.get('hwidUserDevice') or data.get('device') or {}
+        user_uuid = user.get('uuid') or device.get('userUuid')
+        if not user_uuid:
+            return
+        if event.endswith(".added"):
+            api.devices.add(user_uuid, device)
+        elif event.endswith(".deleted"):
+            api.devices.remove(user_uuid, device.get('hwid'))
+        return
+
+    if event.startswith("user."):
+        # Some events wrap the user, others send it bare
+        user = data.get('user') if isinstance(data.get('user'), dict) else data
+        uuid = user.get('uuid')
+        if not uuid:
+            return
+        if event != "user.deleted" and await _is_stale(user):
+            # Late or replayed delivery: don't roll the cache and mirror back
+            logger.info("remnawave_webhook_stale", panel_event=event, uuid=uuid, updated_at=user.get('updatedAt'))
+            return
+        profiles.invalidate_account(uuid)
+        if event == "user.deleted":
+            api.invalidate_user(uuid)
+            api.devices.drop_user(uuid)
+            await mirror.forget(uuid)
+        else:
+            # modified / expired / limited / traffic threshold / ... all carry the current user
+            api.apply_user_snapshot(user)
+            await mirror.remember(user)
+            await mirror.push_snapshots(uuid)
+
+async def handle_remnawave(request: web.Request):
+    body = await request.read()
+    payload = verify(body, request.headers.get(SIGNATURE_HEADER))
+    if payload is None:
+        logger.warning("remnawave_webhook_rejected", remote=request.remote)
+        return web.Response(status=403)
+
+    try:
+        event = payload.get('event') or ""
+        data = payload.get('data') or {}
+        logger.debug("remnawave_webhook", panel_event=event)
+        await apply_panel_event(event, data)
+        return web.Response(text="OK")
+    except Exception as e:
+        logger.error("remnawave_webhook_error", error=str(e))
+        return web.Response(status=500)
@@ -0,0 +1,55 @@
+import asyncio
+import json
+import sys
+import time
+import aiohttp
+from bot.config import config
+from bot.webhooks.remnawave import sign, SIGNATURE_HEADER
+
+# Local stand-in for the panel: signs and posts a sample event to the bot's webhook.
+# Usage: python debug_panel_webhook.py [event] [user_uuid] [url]
+
+SAMPLES = {
+    "user.modified": lambda uuid: {
+        "uuid": uuid,
+        "username": "tg_12345",
+        "telegramId": 12345,
+        "status": "ACTIVE",
+        "expireAt": "2030-01-01T00:00:00.000Z",
+        "updatedAt": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
+        "trafficLimitBytes": 107374182400,
+        "userTraffic": {"usedTrafficBytes": 1073741824},
+        "tag": "TRIAL_YES",
+        "subscriptionUrl": f"https://panel.example.com/sub/{uuid}",
+    },
+    "user.deleted": lambda uuid: {"uuid": uuid},
+    "user_hwid_devices.added": lambda uuid: {
+        "user": {"uuid": uuid},
+        "hwidUserDevice": {"hwid": "debug-hwid-0001", "userUuid": uuid, "platform": "Android", "deviceModel": "Pixel"},
+    },
+    "user_hwid_devices.deleted": lambda uuid: {
+        "user": {"uuid": uuid},
+        "hwidUserDevice": {"hwid": "debug-hwid-0001", "userUuid": uuid},
+    },
+}
+
+async def main():
+    event = sys.argv[1] if len(sys.argv) > 1 else "user.modified"
+    uuid = sys.argv[2] if len(sys.argv) > 2 else "00000000-0000-0000-0000-000000000001"
+    url = sys.argv[3] if len(sys.argv) > 3 else f"http://127.0.0.1:{config.webhook_port}{config.remnawave_webhook_path}"
+
+    if not config.remnawave_webhook_secret:
+        print("REMNAWAVE_WEBHOOK_SECRET is not set")
+        return
+
+    body = json.dumps({"event": event, "timestamp": int(time.time()), "data": SAMPLES[event](uuid)}).encode()
+    headers = {
+        "Content-Type": "application/json",
+        SIGNATURE_HEADER: sign(body, config.remnawave_webhook_secret.get_secret_value()),
+    }
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url, data=body, headers=headers) as resp:
+            print(f"{event} -> {resp.status} {await resp.text()}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
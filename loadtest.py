@@ -0,0 +1,226 @@
+"""
+Synthetic load test for the bot.
+Builds the same Dispatcher as bot.main (create_dispatcher), swaps Telegram for a recording
+session and the panel for mock_remnawave.py, and feeds synthetic updates through
+Dispatcher.feed_update at a fixed concurrency. Reports p50/p95/p99 latency and throughput
+per handler.
+
+The database is whatever POSTGRES_* points at: use a throwaway one, tables are created and
+users/orders are written.
+
+    POSTGRES_HOST=localhost python loadtest.py --users 500 --updates 5000 --concurrency 50
+    python loadtest.py --mix profile=5,devices=2,start=1 --telegram-latency 0.05
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+import mock_remnawave
+
+# Journeys a synthetic user walks through; every step is one update
+SCENARIOS = {
+    "start": [("message", "/start")],
+    "profile": [("message", "👤 Profile")],
+    "trial": [("message", "🎁 Try for free")],
+    "shop": [("message", "🛒 Buy VPN"), ("callback", "buy_tariff_{tariff_id}"), ("callback", "skip_promo"), ("callback", "pay_stars")],
+    "devices": [("callback", "my_devices")],
+    "support": [("message", "🆘 Support"), ("message", "Load test ticket"), ("message", "❌ Cancel")],
+}
+DEFAULT_MIX = "start=1,profile=4,trial=1,shop=1,devices=2,support=1"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200, help="Synthetic Telegram users")
+    parser.add_argument("--updates", type=int, default=2000, help="Updates to feed in total")
+    parser.add_argument("--concurrency", type=int, default=20, help="Updates in flight at once")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Scenario weights, name=weight,...")
+    parser.add_argument("--linked", type=float, default=0.5, help="Share of users that already have a panel account")
+    parser.add_argument("--devices", type=int, default=2, help="Devices per panel account")
+    parser.add_argument("--telegram-latency", type=float, default=0.0, help="Seconds each fake Bot API call takes")
+    parser.add_argument("--panel-url", help="Use a running panel / mock instead of starting one in-process")
+    parser.add_argument("--panel-port", type=int, default=18080)
+    mock_remnawave.add_fault_arguments(parser, prefix="panel-")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+async def main(args):
+    # bot.config reads the environment on import
+    os.environ["REMNAWAVE_URL"] = args.panel_url or f"http://127.0.0.1:{args.panel_port}"
+    os.environ.setdefault("REMNAWAVE_API_KEY", "loadtest")
+    os.environ.setdefault("BOT_TOKEN", "42:LOADTEST")
+    os.environ.setdefault("ADMIN_GROUP_ID", "-100")
+    os.environ.setdefault("LOG_CONSOLE_LEVEL", "WARNING")
+
+    from aiogram import BaseMiddleware, Bot
+    from aiogram.client.session.base import BaseSession
+    from aiogram.types import Update, Message, CallbackQuery, Chat, User, MessageId
+    from sqlalchemy import select
+    from bot.logging_setup import setup_logging
+    from bot.main import create_bot, create_dispatcher
+    from bot.database.core import init_db, async_session
+    from bot.database import models
+    from bot.services.remnawave import api
+    from bot.services.accounts import mirror
+    from bot.services.squads import catalog
+
+    class RecordingSession(BaseSession):
+        """Answers every Bot API call locally and counts them"""
+
+        def __init__(self, latency: float):
+            super().__init__()
+            self.latency = latency
+            self.calls: Counter = Counter()
+            self._ids = itertools.count(1)
+
+        async def make_request(self, bot: Bot, method, timeout=None):
+            self.calls[type(method).__name__] += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            returning = method.__returning__
+            if returning is bool:
+                return True
+            if returning is MessageId:
+                return MessageId(message_id=next(self._ids))
+            if returning is Message or Message in getattr(returning, "__args__", ()):
+                chat_id = getattr(method, "chat_id", None) or 0
+                return Message(
+                    message_id=next(self._ids), date=datetime.now(),
+                    chat=Chat(id=int(chat_id), type="private"), text=getattr(method, "text", None),
+                ).as_(bot)
+            return True
+
+        async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+            yield b""
+
+        async def close(self):
+            pass
+
+    class HandlerProbe(BaseMiddleware):
+        """Inner middleware: reports which handler took the update back to the harness"""
+
+        async def __call__(self, handler, event, data):
+            probe = data.get("loadtest_probe")
+            if probe is not None and data.get("handler") is not None:
+                probe["handler"] = data["handler"].callback.__name__
+            return await handler(event, data)
+
+    setup_logging()
+    rng = random.Random(args.seed)
+    user_ids = [mock_remnawave.TELEGRAM_ID_BASE + i for i in range(args.users)]
+
+    runner = None
+    if not args.panel_url:
+        panel = mock_remnawave.PanelData(seed=args.seed)
+        panel.add_squad("Default")
+        for tid in user_ids:
+            if rng.random() < args.linked:
+                u = panel.add_user(f"tg_{tid}", tid)
+                for _ in range(args.devices):
+                    panel.add_device(u["uuid"])
+        faults = mock_remnawave.faults_from_args(args, prefix="panel_", seed=args.seed)
+        runner = await mock_remnawave.start(panel, port=args.panel_port, faults=faults)
+
+    await init_db()
+    async with async_session() as session:
+        tariff = await session.scalar(select(models.Tariff).where(models.Tariff.is_active == True, models.Tariff.is_trial == False).limit(1))
+        if tariff is None:
+            tariff = models.Tariff(name="Load test 30d", price_rub=100, price_stars=50, price_usd=1, duration_days=30, traffic_limit_gb=100)
+            session.add(tariff)
+            await session.commit()
+        tariff_id = tariff.id
+
+    await api.startup()
+    api.start_background_tasks()
+    await mirror.start()
+    await catalog.start()
+
+    fake = RecordingSession(args.telegram_latency)
+    bot = create_bot(session=fake)
+    dp = create_dispatcher()
+    for observer in (dp.message, dp.callback_query, dp.pre_checkout_query):
+        observer.middleware(HandlerProbe())
+
+    weights = {}
+    for part in args.mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario {name!r}, pick from {', '.join(SCENARIOS)}")
+        weights[name.strip()] = float(weight or 1)
+    names, scenario_weights = list(weights), list(weights.values())
+
+    update_ids = itertools.count(1)
+    message_ids = itertools.count(1)
+
+    def make_update(tid: int, kind: str, payload: str) -> Update:
+        user = User(id=tid, is_bot=False, first_name=f"Load {tid}", language_code="en")
+        chat = Chat(id=tid, type="private")
+        if kind == "message":
+            return Update(update_id=next(update_ids), message=Message(
+                message_id=next(message_ids), date=datetime.now(), chat=chat, from_user=user, text=payload))
+        origin = Message(message_id=next(message_ids), date=datetime.now(), chat=chat, text="menu")
+        return Update(update_id=next(update_ids), callback_query=CallbackQuery(
+            id=str(next(message_ids)), from_user=user, chat_instance=str(tid), data=payload, message=origin))
+
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: Counter = Counter()
+    remaining = [args.updates]
+
+    async def worker(own: list[int]):
+        started_users = set()
+        while remaining[0] > 0:
+            tid = rng.choice(own)
+            # /start first, like a real user: most handlers expect the users row to exist
+            scenario = rng.choices(names, scenario_weights)[0] if tid in started_users else "start"
+            started_users.add(tid)
+            for kind, payload in SCENARIOS[scenario]:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+                probe = {"handler": "unhandled"}
+                update = make_update(tid, kind, payload.format(tariff_id=tariff_id))
+                t0 = time.perf_counter()
+                try:
+                    await dp.feed_update(bot, update, loadtest_probe=probe)
+                except Exception:
+                    errors[probe["handler"]] += 1
+                latencies[probe["handler"]].append(time.perf_counter() - t0)
+
+    concurrency = max(1, min(args.concurrency, len(user_ids)))
+    # Each worker owns a disjoint slice of users, so one user's steps never run concurrently
+    shards = [user_ids[i::concurrency] for i in range(concurrency)]
+    print(f"Feeding {args.updates} updates from {args.users} users at concurrency {concurrency}...")
+    wall = time.perf_counter()
+    try:
+        await asyncio.gather(*(worker(shard) for shard in shards))
+    finally:
+        wall = time.perf_counter() - wall
+        await catalog.stop()
+        await mirror.stop()
+        await api.close()
+        panel_stats = runner.app["stats"] if runner else None
+        if runner:
+            await runner.cleanup()
+
+    total = sum(len(v) for v in latencies.values())
+    print(f"\n{total} updates in {wall:.2f}s: {total / wall:.1f} updates/s\n")
+    print(f"{'handler':<32}{'count':>7}{'errors':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'upd/s':>9}")
+    for handler, values in sorted(latencies.items(), key=lambda kv: -len(kv[1])):
+        values.sort()
+        print(f"{handler:<32}{len(values):>7}{errors[handler]:>7}"
+              f"{percentile(values, 50) * 1000:>9.1f}{percentile(values, 95) * 1000:>9.1f}{percentile(values, 99) * 1000:>9.1f}"
+              f"{len(values) / wall:>9.1f}")
+    print("\nBot API calls: " + ", ".join(f"{k}={v}" for k, v in fake.calls.most_common()))
+    if panel_stats:
+        print("Panel requests: " + ", ".join(f"{k}={v}" for k, v in panel_stats.most_common()))
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
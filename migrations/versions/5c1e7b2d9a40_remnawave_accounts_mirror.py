@@ -0,0 +1,42 @@
+"""remnawave_accounts_mirror
+
+Revision ID: 5c1e7b2d9a40
+Revises: af3b4ead5cad
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1e7b2d9a40'
+down_revision: Union[str, None] = 'af3b4ead5cad'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('remnawave_accounts',
+    sa.Column('uuid', sa.String(length=100), nullable=False),
+    sa.Column('username', sa.String(length=255), nullable=False),
+    sa.Column('telegram_id', sa.BigInteger(), nullable=True),
+    sa.Column('expire_at', sa.DateTime(), nullable=True),
+    sa.Column('traffic_limit_bytes', sa.BigInteger(), nullable=False),
+    sa.Column('traffic_used_bytes', sa.BigInteger(), nullable=False),
+    sa.Column('tag', sa.String(length=255), nullable=True),
+    sa.Column('subscription_url', sa.String(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('synced_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('uuid')
+    )
+    op.create_index(op.f('ix_remnawave_accounts_telegram_id'), 'remnawave_accounts', ['telegram_id'], unique=False)
+    op.create_index(op.f('ix_remnawave_accounts_username'), 'remnawave_accounts', ['username'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_remnawave_accounts_username'), table_name='remnawave_accounts')
+    op.drop_index(op.f('ix_remnawave_accounts_telegram_id'), table_name='remnawave_accounts')
+    op.drop_table('remnawave_accounts')
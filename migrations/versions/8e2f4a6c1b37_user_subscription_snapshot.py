@@ -0,0 +1,62 @@
+"""user_subscription_snapshot
+
+Revision ID: 8e2f4a6c1b37
+Revises: 5c1e7b2d9a40
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e2f4a6c1b37'
+down_revision: Union[str, None] = '5c1e7b2d9a40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('current_tariff_id', sa.Integer(), nullable=True))
+    op.add_column('users', sa.Column('sub_expire_at', sa.DateTime(), nullable=True))
+    op.add_column('users', sa.Column('sub_traffic_limit_bytes', sa.BigInteger(), nullable=True))
+    op.add_column('users', sa.Column('sub_traffic_used_bytes', sa.BigInteger(), nullable=True))
+    op.add_column('users', sa.Column('sub_url', sa.String(), nullable=True))
+    op.add_column('users', sa.Column('sub_synced_at', sa.DateTime(), nullable=True))
+    op.create_foreign_key('users_current_tariff_id_fkey', 'users', 'tariffs', ['current_tariff_id'], ['id'])
+    op.create_index(op.f('ix_users_remnawave_uuid'), 'users', ['remnawave_uuid'], unique=False)
+
+    # Current tariff = tariff of the latest paid order, as the handlers used to compute it
+    op.execute("""
+        UPDATE users SET current_tariff_id = o.tariff_id
+        FROM (
+            SELECT DISTINCT ON (user_id) user_id, tariff_id
+            FROM orders WHERE status = 'PAID'
+            ORDER BY user_id, created_at DESC
+        ) o
+        WHERE users.id = o.user_id
+    """)
+    # Panel fields from the account mirror, if it already synced
+    op.execute("""
+        UPDATE users SET
+            sub_expire_at = ra.expire_at,
+            sub_traffic_limit_bytes = ra.traffic_limit_bytes,
+            sub_traffic_used_bytes = ra.traffic_used_bytes,
+            sub_url = ra.subscription_url,
+            sub_synced_at = ra.synced_at
+        FROM remnawave_accounts ra
+        WHERE users.remnawave_uuid = ra.uuid
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_users_remnawave_uuid'), table_name='users')
+    op.drop_constraint('users_current_tariff_id_fkey', 'users', type_='foreignkey')
+    op.drop_column('users', 'sub_synced_at')
+    op.drop_column('users', 'sub_url')
+    op.drop_column('users', 'sub_traffic_used_bytes')
+    op.drop_column('users', 'sub_traffic_limit_bytes')
+    op.drop_column('users', 'sub_expire_at')
+    op.drop_column('users', 'current_tariff_id')
@@ -0,0 +1,432 @@
+"""
+In-process stand-in for the Remnawave panel API, for offline benchmarking and tests.
+
+Covers what the bot talks to: users (paginated list with search, get, by-telegram-id,
+by-username, create, PATCH, delete), internal-squads and hwid/devices (paginated list,
+per-user list, delete). Responses use the panel's {"response": ...} envelope, PATCH only
+accepts the fields the panel does, and the dataset is generated from a seed, so runs are
+reproducible. Latency, jitter, errors and hangs can be injected, on the command line or at
+runtime through POST /mock/faults; GET /mock/stats counts requests per route.
+
+    python mock_remnawave.py --users 100000 --devices 50000 --latency 0.02 --error-rate 0.01
+    REMNAWAVE_URL=http://127.0.0.1:18080 python debug_remnawave.py
+"""
+import argparse
+import asyncio
+import random
+import uuid as uuidlib
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from aiohttp import web
+
+TELEGRAM_ID_BASE = 10_000_000
+MAX_PAGE_SIZE = 1000
+
+# Fields PATCH /api/users accepts besides uuid; anything else is a 400, as on the panel
+PATCH_FIELDS = {
+    "status", "trafficLimitBytes", "trafficLimitStrategy", "expireAt", "description", "tag",
+    "telegramId", "email", "hwidDeviceLimit", "activeInternalSquads", "onHold",
+}
+CREATE_FIELDS = PATCH_FIELDS | {"username", "note", "proxies", "inbounds", "createdAt"}
+STATUSES = {"ACTIVE", "DISABLED", "LIMITED", "EXPIRED"}
+
+def _iso(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+def _parse_iso(value) -> datetime | None:
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+def _error(status: int, message: str) -> web.Response:
+    return web.json_response({"message": message, "statusCode": status}, status=status)
+
+class Faults:
+    """What the mock does to each request before answering it"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 503, hang_rate: float = 0.0, hang: float = 30.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.hang_rate = hang_rate
+        self.hang = hang
+        self.rng = random.Random(seed)
+
+    def update(self, values: dict):
+        for key in ("latency", "jitter", "error_rate", "error_status", "hang_rate", "hang"):
+            if key in values:
+                setattr(self, key, type(getattr(self, key))(values[key]))
+
+    def as_dict(self) -> dict:
+        return {k: getattr(self, k) for k in ("latency", "jitter", "error_rate", "error_status", "hang_rate", "hang")}
+
+class PanelData:
+    def __init__(self, seed: int = 0):
+        self.rng = random.Random(seed)
+        self.users: dict[str, dict] = {}
+        self.by_telegram_id: dict[int, list[dict]] = {}
+        self.by_username: dict[str, dict] = {}
+        self.devices: list[dict] = []
+        self.squads: list[dict] = []
+        self._user_list: list[dict] | None = None
+
+    def _uuid(self) -> str:
+        return str(uuidlib.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def user_list(self) -> list[dict]:
+        # Listing order is creation order; cached because pages are served far more often than users change
+        if self._user_list is None:
+            self._user_list = list(self.users.values())
+        return self._user_list
+
+    def add_squad(self, name: str) -> dict:
+        squad = {"uuid": self._uuid(), "name": name, "info": {"membersCount": 0, "inboundsCount": 1}, "inbounds": []}
+        self.squads.append(squad)
+        return squad
+
+    def squad_refs(self, uuids) -> list[dict] | None:
+        known = {s["uuid"]: s for s in self.squads}
+        if not isinstance(uuids, list) or any(u not in known for u in uuids):
+            return None
+        return [{"uuid": u, "name": known[u]["name"]} for u in uuids]
+
+    def add_user(self, username: str, telegram_id: int | None = None, **fields) -> dict:
+        now = datetime.now(timezone.utc)
+        uuid = self._uuid()
+        user = {
+            "uuid": uuid,
+            "shortUuid": uuid[:16].replace("-", ""),
+            "username": username,
+            "status": "ACTIVE",
+            "trafficLimitBytes": 0,
+            "trafficLimitStrategy": "NO_RESET",
+            "expireAt": _iso(now),
+            "telegramId": telegram_id,
+            "email": None,
+            "description": None,
+            "tag": None,
+            "hwidDeviceLimit": None,
+            "onHold": False,
+            "subscriptionUrl": f"https://panel.invalid/api/sub/{uuid[:16].replace('-', '')}",
+            "activeInternalSquads": [],
+            "userTraffic": {"usedTrafficBytes": 0, "lifetimeUsedTrafficBytes": 0, "onlineAt": None},
+            "createdAt": _iso(now),
+            "updatedAt": _iso(now),
+        }
+        user.update(fields)
+        self.users[uuid] = user
+        self.by_username[username] = user
+        if telegram_id is not None:
+            self.by_telegram_id.setdefault(int(telegram_id), []).append(user)
+        self._user_list = None
+        return user
+
+    def delete_user(self, uuid: str) -> bool:
+        user = self.users.pop(uuid, None)
+        if user is None:
+            return False
+        self.by_username.pop(user["username"], None)
+        if user.get("telegramId") is not None:
+            owned = self.by_telegram_id.get(int(user["telegramId"]), [])
+            self.by_telegram_id[int(user["telegramId"])] = [u for u in owned if u["uuid"] != uuid]
+        self.devices = [d for d in self.devices if d["userUuid"] != uuid]
+        self._user_list = None
+        return True
+
+    def set_telegram_id(self, user: dict, telegram_id):
+        old = user.get("telegramId")
+        if old is not None:
+            self.by_telegram_id[int(old)] = [u for u in self.by_telegram_id.get(int(old), []) if u is not user]
+        user["telegramId"] = telegram_id
+        if telegram_id is not None:
+            self.by_telegram_id.setdefault(int(telegram_id), []).append(user)
+
+    def add_device(self, user_uuid: str, hwid: str | None = None, **fields) -> dict:
+        now = _iso(datetime.now(timezone.utc))
+        device = {
+            "hwid": hwid or self._uuid().replace("-", "")[:16],
+            "userUuid": user_uuid,
+            "platform": self.rng.choice(("Android", "iOS", "Windows", "macOS", "Linux")),
+            "osVersion": None,
+            "deviceModel": self.rng.choice(("Pixel 8", "iPhone 15", "Galaxy S23", "ThinkPad", "MacBook Air")),
+            "userAgent": "v2rayNG/1.8",
+            "createdAt": now,
+            "updatedAt": now,
+        }
+        device.update(fields)
+        self.devices.append(device)
+        return device
+
+    @classmethod
+    def generate(cls, users: int, devices: int = 0, manual_share: float = 0.05, seed: int = 0,
+                 telegram_id_base: int = TELEGRAM_ID_BASE) -> "PanelData":
+        """
+        users panel accounts: most bot-made (tg_<id>, telegramId set), manual_share created by hand
+        in the panel; expiries spread from a month ago to two months ahead. devices are spread over
+        random users.
+        """
+        data = cls(seed)
+        squads = [data.add_squad(name) for name in ("Default", "Premium", "Trial")]
+        now = datetime.now(timezone.utc)
+        rng = data.rng
+        for i in range(users):
+            tid = telegram_id_base + i
+            limit = rng.choice((0, 50, 100, 200)) * 1024 ** 3
+            squad = rng.choice(squads)
+            fields = {
+                "expireAt": _iso(now + timedelta(days=rng.randint(-30, 60))),
+                "trafficLimitBytes": limit,
+                "userTraffic": {"usedTrafficBytes": rng.randint(0, limit or 10 * 1024 ** 3), "lifetimeUsedTrafficBytes": 0, "onlineAt": None},
+                "activeInternalSquads": [{"uuid": squad["uuid"], "name": squad["name"]}],
+                "tag": "TRIAL_YES" if rng.random() < 0.3 else None,
+            }
+            if rng.random() < manual_share:
+                data.add_user(f"manual_{i}", tid if rng.random() < 0.5 else None, description=f"Imported {i}", **fields)
+            else:
+                data.add_user(f"tg_{tid}", tid, **fields)
+        owners = data.user_list()
+        for _ in range(devices if owners else 0):
+            data.add_device(rng.choice(owners)["uuid"])
+        return data
+
+def _page_args(request: web.Request) -> tuple[int, int] | None:
+    try:
+        start = int(request.query.get("start", 0))
+        size = int(request.query.get("size", 25))
+    except ValueError:
+        return None
+    if start < 0 or not 1 <= size <= MAX_PAGE_SIZE:
+        return None
+    return start, size
+
+def build_app(data: PanelData, faults: Faults | None = None, api_key: str | None = None) -> web.Application:
+    faults = faults or Faults()
+    stats: Counter = Counter()
+    routes = web.RouteTableDef()
+
+    @web.middleware
+    async def panel_middleware(request: web.Request, handler):
+        if request.path.startswith("/mock/"):
+            return await handler(request)
+        resource = request.match_info.route.resource
+        route = f"{request.method} {resource.canonical if resource else request.path}"
+        stats[route] += 1
+        if request.headers.get("X-Correlation-Id"):
+            stats["correlated"] += 1
+        if api_key and request.headers.get("Authorization") != f"Bearer {api_key}":
+            stats["unauthorized"] += 1
+            return _error(401, "Unauthorized")
+
+        delay = faults.latency + (faults.rng.uniform(-faults.jitter, faults.jitter) if faults.jitter else 0)
+        roll = faults.rng.random()
+        if roll < faults.hang_rate:
+            stats["hung"] += 1
+            await asyncio.sleep(faults.hang)
+        elif delay > 0:
+            await asyncio.sleep(delay)
+        if faults.hang_rate <= roll < faults.hang_rate + faults.error_rate:
+            stats["injected_errors"] += 1
+            return _error(faults.error_status, "Injected failure")
+        return await handler(request)
+
+    # --- users ---
+
+    @routes.get("/api/users")
+    async def list_users(request):
+        page = _page_args(request)
+        if page is None:
+            return _error(400, "Invalid pagination")
+        start, size = page
+        users = data.user_list()
+        search = request.query.get("search")
+        if search:
+            users = [u for u in users if search in u["username"] or search == str(u.get("telegramId") or "")
+                     or search in (u.get("email") or "")]
+        return web.json_response({"response": {"users": users[start:start + size], "total": len(users)}})
+
+    @routes.get("/api/users/by-telegram-id/{telegram_id}")
+    async def users_by_telegram_id(request):
+        try:
+            users = data.by_telegram_id.get(int(request.match_info["telegram_id"]), [])
+        except ValueError:
+            return _error(400, "Invalid telegramId")
+        if not users:
+            return _error(404, "Users not found")
+        return web.json_response({"response": users})
+
+    @routes.get("/api/users/by-username/{username}")
+    async def user_by_username(request):
+        user = data.by_username.get(request.match_info["username"])
+        if not user:
+            return _error(404, "User not found")
+        return web.json_response({"response": user})
+
+    @routes.get("/api/users/{uuid}")
+    async def get_user(request):
+        user = data.users.get(request.match_info["uuid"])
+        if not user:
+            return _error(404, "User not found")
+        return web.json_response({"response": user})
+
+    @routes.post("/api/users")
+    async def create_user(request):
+        body = await request.json()
+        unknown = set(body) - CREATE_FIELDS
+        if unknown:
+            return _error(400, f"Unknown fields: {', '.join(sorted(unknown))}")
+        username = body.get("username")
+        if not username or not isinstance(username, str):
+            return _error(400, "username is required")
+        if username in data.by_username:
+            return _error(400, "User username already exists")
+        if body.get("expireAt") is not None and _parse_iso(body["expireAt"]) is None:
+            return _error(400, "Invalid expireAt")
+        fields = {k: v for k, v in body.items() if k in PATCH_FIELDS and k != "telegramId"}
+        if "activeInternalSquads" in fields:
+            refs = data.squad_refs(fields["activeInternalSquads"])
+            if refs is None:
+                return _error(400, "Unknown internal squad")
+            fields["activeInternalSquads"] = refs
+        user = data.add_user(username, body.get("telegramId"), **fields)
+        return web.json_response({"response": user}, status=201)
+
+    @routes.patch("/api/users")
+    async def update_user(request):
+        body = await request.json()
+        user = data.users.get(body.get("uuid"))
+        if not user:
+            return _error(404, "User not found")
+        changes = {k: v for k, v in body.items() if k != "uuid"}
+        unknown = set(changes) - PATCH_FIELDS
+        if unknown:
+            return _error(400, f"Unknown fields: {', '.join(sorted(unknown))}")
+        if "status" in changes and changes["status"] not in STATUSES:
+            return _error(400, "Invalid status")
+        if "expireAt" in changes and _parse_iso(changes["expireAt"]) is None:
+            return _error(400, "Invalid expireAt")
+        if "activeInternalSquads" in changes:
+            refs = data.squad_refs(changes["activeInternalSquads"])
+            if refs is None:
+                return _error(400, "Unknown internal squad")
+            changes["activeInternalSquads"] = refs
+        if "telegramId" in changes:
+            data.set_telegram_id(user, changes.pop("telegramId"))
+        # Only the fields sent change; everything else is kept
+        user.update(changes)
+        if "expireAt" in changes and user["status"] == "EXPIRED" and _parse_iso(changes["expireAt"]) > datetime.now(timezone.utc):
+            user["status"] = "ACTIVE"
+        user["updatedAt"] = _iso(datetime.now(timezone.utc))
+        return web.json_response({"response": user})
+
+    @routes.delete("/api/users/{uuid}")
+    async def delete_user(request):
+        if not data.delete_user(request.match_info["uuid"]):
+            return _error(404, "User not found")
+        return web.json_response({"response": {"isDeleted": True}})
+
+    # --- internal squads ---
+
+    @routes.get("/api/internal-squads")
+    async def list_squads(request):
+        return web.json_response({"response": {"internalSquads": data.squads, "total": len(data.squads)}})
+
+    @routes.get("/api/internal-squads/{uuid}")
+    async def get_squad(request):
+        for squad in data.squads:
+            if squad["uuid"] == request.match_info["uuid"]:
+                return web.json_response({"response": squad})
+        return _error(404, "Internal squad not found")
+
+    # --- hwid devices ---
+
+    @routes.get("/api/hwid/devices")
+    async def list_devices(request):
+        # Like the panel: user filters are ignored, only start/size page the global list
+        page = _page_args(request)
+        if page is None:
+            return _error(400, "Invalid pagination")
+        start, size = page
+        return web.json_response({"response": {"devices": data.devices[start:start + size], "total": len(data.devices)}})
+
+    @routes.get("/api/hwid/devices/{user_uuid}")
+    async def user_devices(request):
+        devices = [d for d in data.devices if d["userUuid"] == request.match_info["user_uuid"]]
+        return web.json_response({"response": {"devices": devices, "total": len(devices)}})
+
+    @routes.post("/api/hwid/devices/delete")
+    async def delete_device(request):
+        body = await request.json()
+        user_uuid = body.get("userUuid")
+        if user_uuid not in data.users:
+            return _error(404, "User not found")
+        before = len(data.devices)
+        data.devices = [d for d in data.devices if not (d["hwid"] == body.get("hwid") and d["userUuid"] == user_uuid)]
+        if len(data.devices) == before:
+            return _error(404, "Device not found")
+        remaining = [d for d in data.devices if d["userUuid"] == user_uuid]
+        return web.json_response({"response": {"devices": remaining, "total": len(remaining)}})
+
+    # --- mock control ---
+
+    @routes.get("/mock/stats")
+    async def mock_stats(request):
+        return web.json_response({"requests": dict(stats), "users": len(data.users), "devices": len(data.devices), "faults": faults.as_dict()})
+
+    @routes.post("/mock/faults")
+    async def mock_faults(request):
+        faults.update(await request.json())
+        return web.json_response(faults.as_dict())
+
+    app = web.Application(middlewares=[panel_middleware])
+    app.add_routes(routes)
+    app["data"] = data
+    app["faults"] = faults
+    app["stats"] = stats
+    return app
+
+async def start(data: PanelData, host: str = "127.0.0.1", port: int = 18080, faults: Faults | None = None,
+                api_key: str | None = None) -> web.AppRunner:
+    runner = web.AppRunner(build_app(data, faults, api_key), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    return runner
+
+def add_fault_arguments(parser: argparse.ArgumentParser, prefix: str = ""):
+    """Fault options shared with loadtest.py (which prefixes them with panel-)"""
+    parser.add_argument(f"--{prefix}latency", type=float, default=0.0, help="Seconds added to every panel response")
+    parser.add_argument(f"--{prefix}jitter", type=float, default=0.0, help="Latency varies by up to +/- this")
+    parser.add_argument(f"--{prefix}error-rate", type=float, default=0.0, help="Share of requests answered with --error-status")
+    parser.add_argument(f"--{prefix}error-status", type=int, default=503)
+    parser.add_argument(f"--{prefix}hang-rate", type=float, default=0.0, help="Share of requests that stall for --hang seconds")
+    parser.add_argument(f"--{prefix}hang", type=float, default=30.0)
+
+def faults_from_args(args: argparse.Namespace, prefix: str = "", seed: int = 0) -> Faults:
+    get = lambda name: getattr(args, (prefix + name).replace("-", "_"))
+    return Faults(latency=get("latency"), jitter=get("jitter"), error_rate=get("error-rate"),
+                  error_status=get("error-status"), hang_rate=get("hang-rate"), hang=get("hang"), seed=seed)
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--devices", type=int, default=500)
+    parser.add_argument("--manual-share", type=float, default=0.05, help="Share of users created by hand in the panel")
+    parser.add_argument("--api-key", help="Require this bearer token (REMNAWAVE_API_KEY)")
+    parser.add_argument("--seed", type=int, default=0)
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    data = PanelData.generate(args.users, args.devices, args.manual_share, seed=args.seed)
+    await start(data, args.host, args.port, faults_from_args(args, seed=args.seed), args.api_key)
+    print(f"Mock panel on http://{args.host}:{args.port}/api ({len(data.users)} users, {len(data.devices)} devices)")
+    await asyncio.Event().wait()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass